@@ -0,0 +1,82 @@
+"""Throughput of live vs. batch protocol turns against the local fake batch server.
+
+Usage: python benchmarks/batch_throughput.py data --limit 50 --batch-latency 5
+"""
+
+import argparse
+import os
+from datetime import datetime
+from pathlib import Path
+
+from fake_batch_server import serve
+from inspect_ai import eval
+from inspect_ai.log import EvalLog
+
+from aspasia.tasks import consultancy_runner, debate_runner
+
+FAKE_MODEL = "openai/gpt-4.1-nano"
+
+
+def samples_per_hour(log: EvalLog) -> float:
+    started = datetime.fromisoformat(log.stats.started_at)
+    completed = datetime.fromisoformat(log.stats.completed_at)
+    num_samples = log.results.completed_samples if log.results else 0
+    return num_samples / (completed - started).total_seconds() * 3600
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument(
+        "--protocol", choices=["debate", "consultancy"], default="debate"
+    )
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--batch-latency", type=float, default=5.0)
+    parser.add_argument("--request-latency", type=float, default=0.5)
+    parser.add_argument("--max-connections", type=int, default=10)
+    parser.add_argument("--log-dir", default="logs/bench_batch")
+    args = parser.parse_args()
+
+    server, api = serve(
+        batch_latency=args.batch_latency, request_latency=args.request_latency
+    )
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "fake"
+
+    runner, roles = (
+        (consultancy_runner, ("consultant_model", "judge_model"))
+        if args.protocol == "consultancy"
+        else (debate_runner, ("debater_model", "judge_model"))
+    )
+    print(f"{'mode':<8}{'samples':>9}{'requests':>10}{'batches':>9}{'samples/h':>11}")
+    for mode, batch_size in [("live", 0), ("batch", args.limit)]:
+        requests, batches = (
+            api.num_live_requests + api.num_batch_requests,
+            api.num_batches,
+        )
+        task = runner(
+            dataset_path=str(args.data_dir),
+            batch_size=batch_size,
+            batch_delay=1.0,
+            **{role: FAKE_MODEL for role in roles},
+        )
+        [log] = eval(
+            task,
+            model="mockllm/model",
+            limit=args.limit,
+            # in batch mode this would cap the number of requests per batch
+            max_connections=None if batch_size else args.max_connections,
+            max_samples=args.limit,
+            log_dir=args.log_dir,
+            display="none",
+        )
+        requests = api.num_live_requests + api.num_batch_requests - requests
+        print(
+            f"{mode:<8}{args.limit:>9}{requests:>10}{api.num_batches - batches:>9}"
+            f"{samples_per_hour(log):>11.0f}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Accuracy vs. judge input tokens of runs with and without judge compaction.
+
+Usage: python benchmarks/compaction_report.py logs/full.eval logs/compacted.eval
+
+The first log is the baseline for the share of judge input tokens saved and the
+change in accuracy. Judge tokens are the protocol judge's input tokens, summaries
+made for compaction included and the scorer's final judge call left out. They are
+averaged over samples that weren't resumed from a checkpoint, as the restored turns
+of resumed ones ran in an earlier eval.
+"""
+
+import argparse
+from statistics import mean
+
+from inspect_ai.log import (
+    EvalLog,
+    EvalSample,
+    ModelEvent,
+    SpanBeginEvent,
+    read_eval_log,
+)
+from inspect_ai.scorer import CORRECT
+
+from aspasia.checkpoints import ResumedSteps
+from aspasia.compaction import JudgeCompaction
+
+
+def protocol_judge_tokens(sample: EvalSample) -> int:
+    """Input tokens of the judge model calls outside the scorers."""
+    scoring: set[str] = set()
+    tokens = 0
+    for event in sample.events:
+        if isinstance(event, SpanBeginEvent) and (
+            event.type == "scorers" or event.parent_id in scoring
+        ):
+            scoring.add(event.id)
+        elif (
+            isinstance(event, ModelEvent)
+            and event.role == "judge"
+            and event.span_id not in scoring
+            and event.output.usage
+        ):
+            tokens += event.output.usage.input_tokens
+    return tokens
+
+
+def summarize(log: EvalLog) -> dict[str, float | str]:
+    samples = log.samples or []
+    fresh = [s for s in samples if not s.store_as(ResumedSteps).num_steps]
+    # runs without compaction don't record judge turns
+    turns = [
+        turn for sample in samples for turn in sample.store_as(JudgeCompaction).turns
+    ]
+    return {
+        "compaction": str(log.eval.task_args.get("judge_compaction")),
+        "samples": len(samples),
+        "accuracy": mean(
+            sample.scores is not None
+            and next(iter(sample.scores.values())).value == CORRECT
+            for sample in samples
+        ),
+        "resumed": len(samples) - len(fresh),
+        "judge_tokens": mean(protocol_judge_tokens(sample) for sample in fresh)
+        if fresh
+        else float("nan"),
+        "compacted": mean(turn["compacted"] for turn in turns) if turns else 0.0,
+        "dropped": mean(turn["dropped"] for turn in turns) if turns else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("logs", nargs="+")
+    args = parser.parse_args()
+
+    summaries = [summarize(read_eval_log(path)) for path in args.logs]
+    baseline = summaries[0]
+    print(
+        f"{'compaction':<12}{'samples':>9}{'resumed':>9}{'accuracy':>10}{'change':>9}"
+        f"{'judge tokens':>14}{'saved':>8}{'compacted':>11}{'dropped':>9}"
+    )
+    for s in summaries:
+        saved = 1 - s["judge_tokens"] / baseline["judge_tokens"]  # type: ignore
+        change = s["accuracy"] - baseline["accuracy"]  # type: ignore
+        print(
+            f"{s['compaction']:<12}{s['samples']:>9}{s['resumed']:>9}"
+            f"{s['accuracy']:>10.3f}"
+            f"{change:>+9.3f}{s['judge_tokens']:>14.0f}{saved:>8.1%}"
+            f"{s['compacted']:>11.2f}{s['dropped']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
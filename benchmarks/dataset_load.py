@@ -0,0 +1,41 @@
+"""Cold vs. warm load time of the preprocessed QuALITY cache.
+
+Usage: python benchmarks/dataset_load.py data --splits train dev
+"""
+
+import argparse
+import shutil
+import time
+from pathlib import Path
+
+from aspasia.datasets import QuALITY
+from aspasia.datasets.quality import CACHE_DIR_NAME
+
+
+def time_load(data_dir: Path, split: str, use_cache: bool = True) -> float:
+    start = time.perf_counter()
+    QuALITY(data_dir, use_cache=use_cache).get_memory_dataset(split)  # type: ignore
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--splits", nargs="+", default=["train", "dev"])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'split':<8}{'no cache, s':>14}{'cold, s':>12}{'warm, s':>12}{'speedup':>10}"
+    )
+    for split in args.splits:
+        shutil.rmtree(args.data_dir / CACHE_DIR_NAME, ignore_errors=True)
+        no_cache = time_load(args.data_dir, split, use_cache=False)
+        cold = time_load(args.data_dir, split)
+        warm = min(time_load(args.data_dir, split) for _ in range(args.repeats))
+        speedup = no_cache / warm
+        print(f"{split:<8}{no_cache:>14.3f}{cold:>12.3f}{warm:>12.3f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Accuracy vs. generated tokens of runs with and without judge early stopping.
+
+Usage: python benchmarks/early_stopping_report.py logs/full.eval logs/early_stop.eval
+
+The first log is the baseline for the share of generated tokens saved. Tokens are
+averaged over samples that weren't resumed from a checkpoint, as the restored turns
+of resumed ones ran in an earlier eval.
+"""
+
+import argparse
+from statistics import mean
+
+from inspect_ai.log import EvalLog, read_eval_log
+from inspect_ai.scorer import CORRECT
+
+from aspasia.checkpoints import ResumedSteps
+from aspasia.protocols import EarlyStopping
+
+
+def summarize(log: EvalLog) -> dict[str, float | str]:
+    samples = log.samples or []
+    num_turns = log.eval.task_args.get("num_turns", 2)
+    fresh = [s for s in samples if not s.store_as(ResumedSteps).num_steps]
+    # runs without early stopping don't record turns
+    turns_run = [
+        sample.store_as(EarlyStopping).turns_run or num_turns for sample in samples
+    ]
+    return {
+        "threshold": str(log.eval.task_args.get("early_stop_threshold")),
+        "samples": len(samples),
+        "accuracy": mean(
+            sample.scores is not None
+            and next(iter(sample.scores.values())).value == CORRECT
+            for sample in samples
+        ),
+        "resumed": len(samples) - len(fresh),
+        "output_tokens": mean(
+            sum(usage.output_tokens for usage in sample.model_usage.values())
+            for sample in fresh
+        )
+        if fresh
+        else float("nan"),
+        "turns_run": mean(turns_run),
+        "turns_saved": num_turns - mean(turns_run),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("logs", nargs="+")
+    args = parser.parse_args()
+
+    summaries = [summarize(read_eval_log(path)) for path in args.logs]
+    baseline_tokens = summaries[0]["output_tokens"]
+    print(
+        f"{'threshold':<11}{'samples':>9}{'resumed':>9}{'accuracy':>10}"
+        f"{'out tokens':>12}"
+        f"{'saved':>8}{'turns run':>11}{'turns saved':>13}"
+    )
+    for s in summaries:
+        saved = 1 - s["output_tokens"] / baseline_tokens  # type: ignore
+        print(
+            f"{s['threshold']:<11}{s['samples']:>9}{s['resumed']:>9}"
+            f"{s['accuracy']:>10.3f}"
+            f"{s['output_tokens']:>12.0f}{saved:>8.1%}{s['turns_run']:>11.2f}"
+            f"{s['turns_saved']:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Local stand-in for the OpenAI Files and Batches API, for offline batch runs.
+
+Implements the endpoints Inspect's OpenAI batcher uses (file upload, batch create and
+retrieve, file content) and live chat completions. Batches complete `batch_latency`
+seconds after they are created, every request gets a canned argument.
+
+Usage: python benchmarks/fake_batch_server.py --port 8765
+then run with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+COMPLETION = "<argument>My answer is supported by the story.</argument> ANSWER: A"
+
+
+def chat_completion(body: dict[str, Any]) -> dict[str, Any]:
+    input_tokens = sum(len(str(m.get("content", ""))) for m in body["messages"]) // 4
+    choices = [
+        {
+            "index": i,
+            "message": {"role": "assistant", "content": COMPLETION},
+            "finish_reason": "stop",
+        }
+        for i in range(body.get("n") or 1)
+    ]
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": choices,
+        "usage": {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": 16 * len(choices),
+            "total_tokens": input_tokens + 16 * len(choices),
+        },
+    }
+
+
+class FakeBatchAPI:
+    """In-memory files and batches."""
+
+    def __init__(self, batch_latency: float, request_latency: float) -> None:
+        self.batch_latency = batch_latency
+        self.request_latency = request_latency
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict[str, Any]] = {}
+        self.num_batches = 0
+        self.num_batch_requests = 0
+        self.num_live_requests = 0
+        self._lock = threading.Lock()
+
+    def create_file(self, content: bytes, purpose: str) -> dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex}"
+        with self._lock:
+            self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl",
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, body: dict[str, Any]) -> dict[str, Any]:
+        requests = self.files[body["input_file_id"]].decode().splitlines()
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "request_counts": {"total": len(requests), "completed": 0, "failed": 0},
+            "_requests": requests,
+            "_done_at": time.monotonic() + self.batch_latency,
+        }
+        with self._lock:
+            self.batches[batch["id"]] = batch
+            self.num_batches += 1
+            self.num_batch_requests += len(requests)
+        return self.public(batch)
+
+    def retrieve_batch(self, batch_id: str) -> dict[str, Any]:
+        batch = self.batches[batch_id]
+        if batch["status"] == "in_progress" and time.monotonic() >= batch["_done_at"]:
+            self.complete(batch)
+        return self.public(batch)
+
+    def complete(self, batch: dict[str, Any]) -> None:
+        results = []
+        for line in batch["_requests"]:
+            request = json.loads(line)
+            results.append(
+                {
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": chat_completion(request["body"]),
+                    },
+                    "error": None,
+                }
+            )
+        output = "\n".join(json.dumps(result) for result in results).encode()
+        batch["output_file_id"] = self.create_file(output, "batch_output")["id"]
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"]["completed"] = len(results)
+
+    @staticmethod
+    def public(batch: dict[str, Any]) -> dict[str, Any]:
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+
+class Handler(BaseHTTPRequestHandler):
+    api: FakeBatchAPI
+
+    def do_GET(self) -> None:
+        parts = self.path.strip("/").split("/")
+        if parts[1:2] == ["batches"] and len(parts) == 3:
+            self.send_json(self.api.retrieve_batch(parts[2]))
+        elif parts[1:2] == ["files"] and parts[3:] == ["content"]:
+            self.send_body(self.api.files[parts[2]], "application/octet-stream")
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/files"):
+            form = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+            )
+            fields = {
+                part.get_param("name", header="content-disposition"): part.get_content()
+                for part in form.iter_parts()
+            }
+            content = fields["file"]
+            if isinstance(content, str):
+                content = content.encode()
+            self.send_json(self.api.create_file(content, str(fields["purpose"])))
+        elif self.path.endswith("/batches"):
+            self.send_json(self.api.create_batch(json.loads(body)))
+        elif self.path.endswith("/chat/completions"):
+            time.sleep(self.api.request_latency)
+            self.api.num_live_requests += 1
+            self.send_json(chat_completion(json.loads(body)))
+        else:
+            self.send_error(404)
+
+    def send_json(self, data: dict[str, Any]) -> None:
+        self.send_body(json.dumps(data).encode(), "application/json")
+
+    def send_body(self, data: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve(
+    port: int = 0, batch_latency: float = 1.0, request_latency: float = 0.2
+) -> tuple[ThreadingHTTPServer, FakeBatchAPI]:
+    """Start the server in a daemon thread, port 0 picks a free one."""
+    api = FakeBatchAPI(batch_latency, request_latency)
+    handler = type("FakeBatchHandler", (Handler,), {"api": api})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, api
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-latency", type=float, default=1.0)
+    parser.add_argument("--request-latency", type=float, default=0.2)
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.batch_latency, args.request_latency)
+    print(f"Serving on http://127.0.0.1:{server.server_port}/v1")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
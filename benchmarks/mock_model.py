@@ -0,0 +1,55 @@
+"""Mock model API with a fixed fake latency, registered as `latency_mock`.
+
+The model name is the latency in seconds, e.g. `latency_mock/0.2`. Importing the module
+registers the provider.
+"""
+
+import anyio
+from inspect_ai.model import (
+    ChatMessage,
+    GenerateConfig,
+    ModelAPI,
+    ModelOutput,
+    ModelUsage,
+    modelapi,
+)
+from inspect_ai.tool import ToolChoice, ToolInfo
+
+COMPLETION = "<argument>My answer is supported by the story.</argument> ANSWER: A"
+
+
+class LatencyMockAPI(ModelAPI):
+    def __init__(
+        self,
+        model_name: str,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        config: GenerateConfig = GenerateConfig(),
+    ) -> None:
+        super().__init__(model_name, base_url, api_key, [], config)
+        self.latency = float(model_name)
+
+    async def generate(
+        self,
+        input: list[ChatMessage],
+        tools: list[ToolInfo],
+        tool_choice: ToolChoice,
+        config: GenerateConfig,
+    ) -> ModelOutput:
+        await anyio.sleep(self.latency)
+        output = ModelOutput.from_content(model=self.model_name, content=COMPLETION)
+        input_tokens = sum(len(message.text) for message in input) // 4
+        output.usage = ModelUsage(
+            input_tokens=input_tokens,
+            output_tokens=16,
+            total_tokens=input_tokens + 16,
+        )
+        return output
+
+    def max_connections(self) -> int:
+        return 1024
+
+
+@modelapi(name="latency_mock")
+def latency_mock() -> type[ModelAPI]:
+    return LatencyMockAPI
@@ -0,0 +1,43 @@
+"""Memory and serialized size of QuALITY samples, optionally with .eval log sizes.
+
+Usage: python benchmarks/sample_footprint.py data --splits train dev --logs logs/*.eval
+"""
+
+import argparse
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+from aspasia.datasets import QuALITY
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--splits", nargs="+", default=["train", "dev"])
+    parser.add_argument("--logs", nargs="*", type=Path, default=[])
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    quality = QuALITY(args.data_dir)
+    datasets = [quality.get_memory_dataset(split) for split in args.splits]
+    # every sample is copied into its own TaskState during an eval
+    states = [
+        sample.model_copy(deep=True) for dataset in datasets for sample in dataset
+    ]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    serialized = sum(len(sample.model_dump_json()) for sample in states)
+
+    print(f"samples:                  {len(states)}")
+    print(f"traced memory, MB:        {current / 2**20:.1f} (peak {peak / 2**20:.1f})")
+    print(f"serialized samples, MB:   {serialized / 2**20:.1f}")
+    for log in args.logs:
+        with zipfile.ZipFile(log) as z:
+            raw = sum(info.file_size for info in z.infolist())
+            packed = sum(info.compress_size for info in z.infolist())
+        print(f"{log.name}: {raw / 2**20:.1f} MB raw, {packed / 2**20:.1f} MB zipped")
+
+
+if __name__ == "__main__":
+    main()
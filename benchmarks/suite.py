@@ -0,0 +1,218 @@
+"""Protocol overhead of aspasia, separated from provider latency with a mock model.
+
+Measures dataset load time, Python overhead per model turn, peak memory per sample
+and throughput for every max_connections value, and writes them to a JSON file
+that can be compared between versions.
+
+Usage: python benchmarks/suite.py data --output results.json --compare old.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import UTC, datetime
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any
+
+import mock_model  # noqa: F401 registers latency_mock
+from dataset_load import time_load
+from inspect_ai import Task, eval
+from inspect_ai.log import EvalLog, ModelEvent
+
+from aspasia.tasks import consultancy_runner, debate_runner
+
+
+def protocol_task(protocol: str, data_dir: Path, latency: float) -> Task:
+    model = f"latency_mock/{latency}"
+    if protocol == "consultancy":
+        return consultancy_runner(
+            dataset_path=str(data_dir), consultant_model=model, judge_model=model
+        )
+    return debate_runner(
+        dataset_path=str(data_dir), debater_model=model, judge_model=model
+    )
+
+
+def run_protocol(
+    protocol: str,
+    data_dir: Path,
+    latency: float,
+    limit: int,
+    max_connections: int,
+    log_dir: str,
+) -> EvalLog:
+    [log] = eval(
+        protocol_task(protocol, data_dir, latency),
+        model="latency_mock/0",
+        limit=limit,
+        max_connections=max_connections,
+        log_dir=log_dir,
+        display="none",
+    )
+    if log.status != "success":
+        raise RuntimeError(f"{protocol} run failed: {log.error}")
+    return log
+
+
+def bench_dataset_load(data_dir: Path, repeats: int) -> dict[str, float]:
+    return {
+        "no_cache_s": time_load(data_dir, "dev", use_cache=False),
+        "warm_s": min(time_load(data_dir, "dev") for _ in range(repeats)),
+    }
+
+
+def bench_turn_overhead(
+    protocol: str, data_dir: Path, limit: int, log_dir: str
+) -> dict[str, float]:
+    """Sample working time not spent in model calls, per model call.
+
+    Samples run one at a time against a zero latency model, so the result is the
+    cost of building inputs, agents and protocol bookkeeping (aspasia and Inspect).
+    """
+    log = run_protocol(protocol, data_dir, 0, limit, 1, log_dir)
+    working_time = 0.0
+    model_time = 0.0
+    num_turns = 0
+    for sample in log.samples or []:
+        working_time += sample.working_time or 0
+        for event in sample.events:
+            if isinstance(event, ModelEvent):
+                model_time += event.working_time or 0
+                num_turns += 1
+    return {
+        "turns": num_turns,
+        "turn_overhead_ms": (working_time - model_time) / num_turns * 1000,
+    }
+
+
+def bench_peak_memory(
+    protocol: str, data_dir: Path, limit: int, log_dir: str
+) -> dict[str, float]:
+    """Peak traced memory of an eval above the memory before it, per sample."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run_protocol(protocol, data_dir, 0, limit, limit, log_dir)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"peak_memory_per_sample_mb": (peak - before) / limit / 2**20}
+
+
+def bench_scaling(
+    protocol: str,
+    data_dir: Path,
+    latency: float,
+    limit: int,
+    max_connections: list[int],
+    log_dir: str,
+) -> dict[str, float]:
+    """Samples per second for every max_connections value."""
+    samples_per_s = {}
+    for connections in max_connections:
+        start = time.perf_counter()
+        run_protocol(protocol, data_dir, latency, limit, connections, log_dir)
+        samples_per_s[str(connections)] = limit / (time.perf_counter() - start)
+    return samples_per_s
+
+
+def environment() -> dict[str, Any]:
+    try:
+        aspasia_version = version("aspasia")
+    except PackageNotFoundError:
+        aspasia_version = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "aspasia": aspasia_version,
+        "commit": commit,
+        "inspect_ai": version("inspect_ai"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+
+def flatten(results: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, int | float) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline: dict[str, Any], results: dict[str, Any]) -> None:
+    old, new = flatten(baseline), flatten(results)
+    for key in sorted(old.keys() & new.keys()):
+        if key.startswith("config.") or not old[key]:
+            continue
+        change = new[key] / old[key] - 1
+        print(f"{key:<45}{old[key]:>12.4g}{new[key]:>12.4g}{change:>+9.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--protocols", nargs="+", default=["consultancy", "debate"])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument(
+        "--max-connections", nargs="+", type=int, default=[1, 2, 4, 8, 16]
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument(
+        "--compare", type=Path, help="Results file of a previous version to compare to"
+    )
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {
+        "environment": environment(),
+        "config": {
+            "limit": args.limit,
+            "latency_s": args.latency,
+            "max_connections": args.max_connections,
+        },
+        "dataset_load": bench_dataset_load(args.data_dir, args.repeats),
+    }
+    print(f"dataset_load: {results['dataset_load']}")
+    with tempfile.TemporaryDirectory() as log_dir:
+        for protocol in args.protocols:
+            start = time.perf_counter()
+            results[protocol] = {
+                **bench_turn_overhead(protocol, args.data_dir, args.limit, log_dir),
+                **bench_peak_memory(protocol, args.data_dir, args.limit, log_dir),
+                "samples_per_s": bench_scaling(
+                    protocol,
+                    args.data_dir,
+                    args.latency,
+                    args.limit,
+                    args.max_connections,
+                    log_dir,
+                ),
+            }
+            elapsed = time.perf_counter() - start
+            print(f"{protocol} ({elapsed:.0f}s): {results[protocol]}")
+
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,15 @@
-from .tasks import consultancy_runner, debate_runner
+from .scorers import judge_logprobs
+from .tasks import (
+    consultancy_runner,
+    debate_runner,
+    debate_sweep_runner,
+    rejudge_runner,
+)
 
-__all__ = ["consultancy_runner", "debate_runner"]
+__all__ = [
+    "consultancy_runner",
+    "debate_runner",
+    "debate_sweep_runner",
+    "judge_logprobs",
+    "rejudge_runner",
+]
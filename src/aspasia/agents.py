@@ -1,25 +1,196 @@
+import time
+from collections.abc import Callable
+from typing import Literal
+
 from inspect_ai.agent import Agent, AgentState, agent
-from inspect_ai.model import ChatMessageSystem, ChatMessageUser, get_model
-from inspect_ai.util import input_screen
+from inspect_ai.model import (
+    ChatMessage,
+    ChatMessageUser,
+    GenerateConfig,
+    Model,
+    ModelOutput,
+    get_model,
+)
+from inspect_ai.solver._task_state import sample_state
+from inspect_ai.util import StoreModel, store_as
+from pydantic import Field
+
+from aspasia.best_of_n import best_of_n
+from aspasia.cache import GenerationCache, generate_loop
+from aspasia.compaction import Compaction
+from aspasia.human_interface import ask_human, prompt_for_reply
+from aspasia.judge_server import JudgeServer
+from aspasia.quotes import quote_verifier
+from aspasia.scheduler import current_scheduler
+from aspasia.tags import public_message
+from aspasia.telemetry import current_telemetry
+from aspasia.utils import MessageView, MessageViews, prepare_messages
+
+MessageLayout = Literal["inline", "prefix"]
+"""Where agents put their side:
+
+- inline: into the question (consultant) or the system prompt (debater).
+- prefix: into a trailing message after the history, so system prompt, question
+    and article stay a byte-stable prefix that providers can cache across turns
+    and agents.
+"""
+
+
+class PromptCacheUsage(StoreModel):
+    """Per-turn input and cached input tokens, saved in the sample store."""
+
+    turns: list[dict[str, str | int]] = Field(default_factory=list)
+
+
+def record_prompt_cache_usage(role: str, output: ModelOutput) -> None:
+    usage = output.usage
+    if usage is None:
+        return
+    prompt_cache = store_as(PromptCacheUsage)
+    prompt_cache.turns = [
+        *prompt_cache.turns,
+        {
+            "role": role,
+            "input_tokens": usage.input_tokens,
+            "cached_tokens": usage.input_tokens_cache_read or 0,
+        },
+    ]
 
-from aspasia.human_interface import display_chat_history_in_console, prompt_for_reply
-from aspasia.utils import prepare_messages
+
+def layout_config(layout: MessageLayout) -> GenerateConfig:
+    return GenerateConfig(cache_prompt=True if layout == "prefix" else None)
+
+
+async def generate_turn(
+    model: Model,
+    role: str,
+    messages: list[ChatMessage],
+    cache: GenerationCache | None,
+    config: GenerateConfig,
+    n: int = 1,
+    num_filtered: int = 0,
+) -> tuple[list[ChatMessage], ModelOutput]:
+    """Generate an agent turn, best-of-n when n > 1.
+
+    Turns that aren't in the cache go through the scheduler's budget of the role.
+    New messages are tagged with role as `agent` in their metadata.
+
+    num_filtered (messages of the history the agent doesn't see) is only recorded
+    in the turn's telemetry span.
+    """
+    telemetry = current_telemetry()
+    scheduler = current_scheduler()
+    start = time.perf_counter() if telemetry.enabled else 0.0
+
+    async def generate() -> tuple[list[ChatMessage], ModelOutput]:
+        if n == 1:
+            return await model.generate_loop(messages, config=config)
+        return await best_of_n(model, messages, n, config)
+
+    new_messages, output = await generate_loop(
+        model,
+        role if n == 1 else f"{role}/best_of_{n}",
+        messages,
+        cache,
+        config,
+        generate=(
+            lambda: scheduler.generate(role, model, messages, config, generate, n)
+        )
+        if scheduler.enabled
+        else generate,
+    )
+    for message in new_messages:
+        message.metadata = {**(message.metadata or {}), "agent": role}
+    if telemetry.enabled:
+        telemetry.record_generation(
+            role,
+            model,
+            output,
+            time.perf_counter() - start,
+            len(messages),
+            num_filtered,
+        )
+    return new_messages, output
+
+
+def judge_transform(
+    messages: list[ChatMessage], verify_quotes: float | None = None
+) -> Callable[[ChatMessage], ChatMessage]:
+    """Transform of messages the judge sees: only public parts (`<argument>` and
+    quotes) are kept and, with verify_quotes, quotes are marked, see `judge_agent`."""
+    verifier = (
+        None if verify_quotes is None else quote_verifier(messages, verify_quotes)
+    )
+    if verifier is None:
+        return public_message
+    return lambda message: verifier(public_message(message))
+
+
+def side_prompt(message: ChatMessage) -> str:
+    letter_side = message.metadata["target"]  # type: ignore
+    return f"\nYou are arguing for {letter_side}"
+
+
+def side_message(message: ChatMessage) -> ChatMessageUser:
+    return ChatMessageUser(content=side_prompt(message).strip())
+
+
+def with_side_prompt(message: ChatMessage) -> ChatMessage:
+    """Copy of the question message (the one carrying target) with side prompt."""
+    if message.metadata and "target" in message.metadata:
+        return message.model_copy(
+            update={"content": str(message.content) + side_prompt(message)}
+        )
+    return message
 
 
 @agent
 def consultant_agent(
     agent_prompt: str,
+    cache: GenerationCache | None = None,
+    layout: MessageLayout = "inline",
+    n: int = 1,
+    config: GenerateConfig = GenerateConfig(),
 ) -> Agent:
+    """Consultant arguing for the target answer.
+
+    Args:
+        agent_prompt: System prompt.
+        cache: Disk cache for generations.
+        layout: Where the side prompt goes, see `MessageLayout`.
+        n: Number of candidate arguments per turn, the judge role model picks the
+            most persuasive one when n > 1.
+        config: Generate config of every turn, e.g. to submit turns as batch jobs.
+    """
+    # append agent prompt and, for inline layout, add side prompt to the question
+    views = MessageViews(
+        lambda _: MessageView(
+            agent_prompt=agent_prompt,
+            transform=with_side_prompt if layout == "inline" else None,
+        )
+    )
+    config = layout_config(layout).merge(config)
+
     async def execute(state: AgentState) -> AgentState:
         model = get_model(role="consultant")
-        # append agent prompt
-        consultant_messages = [ChatMessageSystem(content=agent_prompt)] + state.messages
-        # Add side prompt
-        letter_side = state.messages[0].metadata["target"] # type: ignore
-        side_prompt = f"\nYou are arguing for {letter_side}"
-        consultant_messages[1].content = str(consultant_messages[1].content) + side_prompt
-
-        messages, output = await model.generate_loop(consultant_messages)
+        view = views.view(state.messages)
+        consultant_messages = view.update(state.messages)
+        if layout == "prefix":
+            consultant_messages = [
+                *consultant_messages,
+                side_message(state.messages[0]),
+            ]
+
+        messages, output = await generate_turn(
+            model,
+            "consultant",
+            consultant_messages,
+            cache,
+            config,
+            n,
+            view.num_filtered,
+        )
+        record_prompt_cache_usage("consultant", output)
         state.output = output
         state.messages.extend(messages)
         return state
@@ -28,14 +199,58 @@ def consultant_agent(
 
 
 @agent
-def judge_agent(agent_prompt: str, ignore_msg_with_tags: list[str] = []) -> Agent:
+def judge_agent(
+    agent_prompt: str,
+    ignore_msg_with_tags: list[str] = [],
+    cache: GenerationCache | None = None,
+    layout: MessageLayout = "inline",
+    config: GenerateConfig = GenerateConfig(),
+    verify_quotes: float | None = None,
+    model_role: str = "judge",
+    compaction: Compaction | None = None,
+) -> Agent:
+    """LLM judge, it only sees the public parts of other agents' messages.
+
+    Args:
+        agent_prompt: System prompt.
+        ignore_msg_with_tags: Messages starting with these tags are hidden from the
+            judge.
+        cache: Disk cache for generations.
+        layout: Message layout of the protocol, see `MessageLayout`.
+        config: Generate config of every turn.
+        verify_quotes: Mark `<quote>`s of the history as verified or unverified
+            against the sample's article, a quote is verified when this fraction of
+            its words is found as one run in the article (1.0 for exact quotes).
+        model_role: Model role of the judge, e.g. to compare judge models in one
+            task.
+        compaction: Keep the judge's input under a token budget by shortening older
+            messages of the history.
+    """
+    views = MessageViews(
+        lambda messages: MessageView(
+            ignore_msg_with_tags,
+            agent_prompt=agent_prompt,
+            transform=judge_transform(messages, verify_quotes),
+        )
+    )
+    config = layout_config(layout).merge(config)
+
     async def execute(state: AgentState) -> AgentState:
-        model = get_model(role="judge")
+        model = get_model(role=model_role)
 
-        judge_messages: list = prepare_messages(
-            state.messages, ignore_msg_with_tags, agent_prompt
+        view = views.view(state.messages)
+        judge_messages = view.update(state.messages)
+        if compaction is not None:
+            judge_messages = await compaction.compact(judge_messages, model)
+        response, output = await generate_turn(
+            model,
+            "judge",
+            judge_messages,
+            cache,
+            config,
+            num_filtered=view.num_filtered,
         )
-        response, output = await model.generate_loop(judge_messages)
+        record_prompt_cache_usage("judge", output)
         state.messages.extend(response)
         state.output = output
         return state
@@ -44,17 +259,49 @@ def judge_agent(agent_prompt: str, ignore_msg_with_tags: list[str] = []) -> Agen
 
 
 @agent
-def debater_agent(agent_prompt: str):
+def debater_agent(
+    agent_prompt: str,
+    cache: GenerationCache | None = None,
+    layout: MessageLayout = "inline",
+    n: int = 1,
+    config: GenerateConfig = GenerateConfig(),
+):
+    """Debater arguing for the target answer.
+
+    Args:
+        agent_prompt: System prompt.
+        cache: Disk cache for generations.
+        layout: Where the side prompt goes, see `MessageLayout`.
+        n: Number of candidate arguments per turn, the judge role model picks the
+            most persuasive one when n > 1.
+        config: Generate config of every turn, e.g. to submit turns as batch jobs.
+    """
+    # append agent prompt, with side prompt for inline layout
+    views = MessageViews(
+        lambda messages: MessageView(
+            agent_prompt=agent_prompt
+            + (side_prompt(messages[0]) if layout == "inline" else "")
+        )
+    )
+    config = layout_config(layout).merge(config)
+
     async def execute(state: AgentState) -> AgentState:
         model = get_model(role="debater")
-        # append agent prompt
-        debater_messages = [ChatMessageSystem(content=agent_prompt)] + state.messages
-        # Add side prompt
-        letter_side = state.messages[0].metadata["target"] # type: ignore
-        side_prompt = f"\nYou are arguing for {letter_side}"
-        debater_messages[0].content = str(debater_messages[0].content) + side_prompt
-
-        messages, output = await model.generate_loop(debater_messages)
+        view = views.view(state.messages)
+        debater_messages = view.update(state.messages)
+        if layout == "prefix":
+            debater_messages = [*debater_messages, side_message(state.messages[0])]
+
+        messages, output = await generate_turn(
+            model,
+            "debater",
+            debater_messages,
+            cache,
+            config,
+            n,
+            view.num_filtered,
+        )
+        record_prompt_cache_usage("debater", output)
         state.output = output
         state.messages.extend(messages)
         return state
@@ -65,17 +312,20 @@ def debater_agent(agent_prompt: str):
 # TODO: Decide what version to keep: this one or
 # in interactive_consultant(style generated with Chatgpt)
 @agent
-def human_judge_agent(ignore_msg_with_tags: list[str] = []) -> Agent:
+def human_judge_agent(
+    ignore_msg_with_tags: list[str] = [], verify_quotes: float | None = None
+) -> Agent:
     async def execute(state: AgentState) -> AgentState:
-        with input_screen(transient=False) as console:
-            judge_messages: list = prepare_messages(
-                state.messages,
-                ignore_msg_with_tags,
-            )
-            display_chat_history_in_console(console, judge_messages)
-            response = console.input("Write your reply:")
+        judge_messages: list = prepare_messages(
+            state.messages,
+            ignore_msg_with_tags,
+            transform=judge_transform(state.messages, verify_quotes),
+        )
+        response = await ask_human(judge_messages)
 
-        state.messages.append(ChatMessageUser(content=response))
+        state.messages.append(
+            ChatMessageUser(content=response, metadata={"agent": "judge"})
+        )
         return state
 
     return execute
@@ -84,13 +334,48 @@ def human_judge_agent(ignore_msg_with_tags: list[str] = []) -> Agent:
 @agent
 def human_judge(ignore_msg_with_tags: list[str] = []) -> Agent:
     async def execute(state: AgentState) -> AgentState:
-        with input_screen(transient=False) as console:
-            judge_messages: list = prepare_messages(
-                state.messages, ignore_msg_with_tags
+        judge_messages: list = prepare_messages(
+            state.messages,
+            ignore_msg_with_tags,
+            transform=judge_transform(state.messages),
+        )
+        response = await ask_human(
+            judge_messages,
+            lambda console, messages: prompt_for_reply(
+                console, prompt="Write your reply", messages=messages
+            ),
+        )
+        state.messages.append(
+            ChatMessageUser(content=response, metadata={"agent": "judge"})
+        )
+        return state
+
+    return execute
+
+
+@agent
+def web_judge_agent(
+    server: JudgeServer,
+    ignore_msg_with_tags: list[str] = [],
+    verify_quotes: float | None = None,
+) -> Agent:
+    """Human judge answering through the judge server, see `JudgeServer`."""
+
+    async def execute(state: AgentState) -> AgentState:
+        judge_messages = prepare_messages(
+            state.messages,
+            ignore_msg_with_tags,
+            transform=judge_transform(state.messages, verify_quotes),
+        )
+        current = sample_state()
+        response, judge = await server.ask(
+            judge_messages, current.sample_id if current else None
+        )
+        state.messages.append(
+            ChatMessageUser(
+                content=response, metadata={"agent": "judge", "judge": judge}
             )
-            display_chat_history_in_console(console, judge_messages)
-            response = prompt_for_reply(console, prompt="Write your reply")
-        state.messages.append(ChatMessageUser(content=response))
+        )
         return state
 
     return execute
@@ -0,0 +1,120 @@
+import math
+
+from inspect_ai.model import (
+    ChatMessage,
+    ChatMessageAssistant,
+    ChatMessageSystem,
+    ChatMessageUser,
+    GenerateConfig,
+    Model,
+    ModelOutput,
+    get_model,
+)
+from inspect_ai.util import collect
+
+from aspasia.prompts import BEST_OF_N_PROMPT, BEST_OF_N_TEMPLATE
+from aspasia.tags import parse_tags
+
+MAX_CANDIDATES = 9  # candidates are picked with a single digit token
+
+
+async def generate_candidates(
+    model: Model, messages: list[ChatMessage], n: int, config: GenerateConfig
+) -> list[ModelOutput]:
+    """N candidate outputs, from one request with num_choices when the provider
+    supports it, topped up with concurrent requests otherwise."""
+    output = await model.generate(
+        messages, config=config.merge(GenerateConfig(num_choices=n))
+    )
+    candidates = [
+        output.model_copy(update={"choices": [choice]}) for choice in output.choices
+    ][:n]
+    if len(candidates) < n:
+        candidates.extend(
+            await collect(
+                *(
+                    model.generate(messages, config=config)
+                    for _ in range(n - len(candidates))
+                )
+            )
+        )
+    return candidates
+
+
+async def select_candidate(
+    preference_model: Model, question: str, candidates: list[str]
+) -> tuple[int, list[float]]:
+    """Index of the most persuasive candidate and preference scores of all of them.
+
+    Candidates should only have their public parts, like the judge sees them.
+
+    The preference model answers with a single token. Scores are the probabilities
+    of candidate numbers when logprobs are available, otherwise the chosen candidate
+    gets 1.0.
+    """
+    arguments = "\n".join(
+        f"<argument_{i}>{candidate}</argument_{i}>"
+        for i, candidate in enumerate(candidates, start=1)
+    )
+    output = await preference_model.generate(
+        [
+            ChatMessageSystem(content=BEST_OF_N_PROMPT),
+            ChatMessageUser(
+                content=BEST_OF_N_TEMPLATE.format(
+                    question=question, candidates=arguments, n=len(candidates)
+                )
+            ),
+        ],
+        config=GenerateConfig(
+            max_tokens=1, logprobs=True, top_logprobs=min(20, len(candidates) + 5)
+        ),
+    )
+    labels = [str(i) for i in range(1, len(candidates) + 1)]
+    scores = [0.0] * len(candidates)
+    logprobs = output.choices[0].logprobs if output.choices else None
+    if logprobs and logprobs.content and logprobs.content[0].top_logprobs:
+        for top in logprobs.content[0].top_logprobs:
+            token = top.token.strip()
+            if token in labels:
+                scores[labels.index(token)] += math.exp(top.logprob)
+    else:
+        answer = output.completion.strip()[:1]
+        if answer in labels:
+            scores[labels.index(answer)] = 1.0
+    return max(range(len(scores)), key=lambda i: scores[i]), scores
+
+
+async def best_of_n(
+    model: Model,
+    messages: list[ChatMessage],
+    n: int,
+    config: GenerateConfig = GenerateConfig(),
+    preference_role: str = "judge",
+) -> tuple[list[ChatMessage], ModelOutput]:
+    """Generate n candidates and keep the one preferred by the preference_role model.
+
+    Returns the same shape as `Model.generate_loop`, the selected message carries
+    the candidates' preference scores in its metadata.
+    """
+    if not 1 < n <= MAX_CANDIDATES:
+        raise ValueError(f"Best-of-N needs 1 < n <= {MAX_CANDIDATES}, got {n=}")
+    candidates = await generate_candidates(model, messages, n, config)
+    question = next(
+        (str(m.content) for m in messages if isinstance(m, ChatMessageUser)), ""
+    )
+    selected, scores = await select_candidate(
+        get_model(role=preference_role),
+        question,
+        [parse_tags(candidate.completion).public for candidate in candidates],
+    )
+    output = candidates[selected]
+    message: ChatMessageAssistant = output.message.model_copy(
+        update={
+            "metadata": {
+                **(output.message.metadata or {}),
+                "best_of_n": {"n": n, "selected": selected, "scores": scores},
+            }
+        }
+    )
+    output.choices[0].message = message
+    return [message], output
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from inspect_ai.model import ChatMessage, GenerateConfig, Model, ModelOutput
+from inspect_ai.util import StoreModel, store_as
+from pydantic import TypeAdapter
+
+logger = logging.getLogger(__name__)
+
+GenerateFn = Callable[[], Awaitable[tuple[list[ChatMessage], ModelOutput]]]
+
+MESSAGES_ADAPTER = TypeAdapter(list[ChatMessage])
+# config fields that don't change what the model generates
+CONNECTION_CONFIG_FIELDS = {"max_connections", "max_retries", "timeout", "batch"}
+# message fields that don't change what the model sees
+MESSAGE_IGNORED_FIELDS = {"id", "source", "metadata"}
+
+
+class GenerationCacheMissError(RuntimeError):
+    pass
+
+
+class GenerationCacheStats(StoreModel):
+    """Per-sample cache counters, saved with the sample store in the eval log."""
+
+    hits: int = 0
+    misses: int = 0
+
+
+class GenerationCache:
+    """Content-addressed disk cache of agent generations.
+
+    Entries are keyed by model, role, normalized input messages and generate config.
+    Each entry is a JSON file, its modification time is refreshed on every hit and
+    the least recently used entries are evicted once the cache exceeds max_size.
+
+    Args:
+        cache_dir: Directory with cache entries.
+        max_size: Maximum total size of entries in bytes.
+        replay: Read-only mode. Nothing is written and a cache miss raises
+            `GenerationCacheMissError` instead of calling the model.
+    """
+
+    def __init__(
+        self, cache_dir: Path, max_size: int = 2**30, replay: bool = False
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.replay = replay
+        self._size: int | None = None
+
+    async def generate_loop(
+        self,
+        model: Model,
+        role: str,
+        messages: list[ChatMessage],
+        config: GenerateConfig = GenerateConfig(),
+        generate: GenerateFn | None = None,
+    ) -> tuple[list[ChatMessage], ModelOutput]:
+        """Cached `Model.generate_loop`, or of generate when it's given."""
+        stats = store_as(GenerationCacheStats)
+        key = self.key(model, role, messages, config)
+        cached = self.get(key)
+        if cached is not None:
+            stats.hits += 1
+            return cached
+        stats.misses += 1
+        if self.replay:
+            raise GenerationCacheMissError(
+                f"No cached generation for {role=} of {model} in {self.cache_dir}"
+            )
+        if generate is None:
+            new_messages, output = await model.generate_loop(messages, config=config)
+        else:
+            new_messages, output = await generate()
+        self.put(key, new_messages, output)
+        return new_messages, output
+
+    @staticmethod
+    def key(
+        model: Model, role: str, messages: list[ChatMessage], config: GenerateConfig
+    ) -> str:
+        effective_config = model.config.merge(config).model_dump(
+            exclude=CONNECTION_CONFIG_FIELDS, exclude_none=True
+        )
+        normalized_messages = [
+            message.model_dump(exclude=MESSAGE_IGNORED_FIELDS, exclude_none=True)
+            for message in messages
+        ]
+        content = json.dumps(
+            [str(model), role, normalized_messages, effective_config],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[list[ChatMessage], ModelOutput] | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Ignoring unreadable generation cache entry {path}: {ex}")
+            return None
+        messages = MESSAGES_ADAPTER.validate_python(entry["messages"])
+        if not messages:
+            # every generation replies, an entry without messages lost its reply
+            return None
+        output = ModelOutput.model_validate(entry["output"])
+        # returned messages and output choice are the same objects in generate_loop
+        if output.choices:
+            output.choices[-1].message = messages[-1]  # type: ignore
+        return messages, output
+
+    def put(self, key: str, messages: list[ChatMessage], output: ModelOutput) -> None:
+        # ids are dropped, so every hit gets fresh message ids
+        entry = {
+            "messages": [message.model_dump(exclude={"id"}) for message in messages],
+            "output": output.model_dump(),
+        }
+        for choice in entry["output"]["choices"]:
+            choice["message"].pop("id", None)
+        path = self._path(key)
+        data = json.dumps(entry, default=str)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(data)
+            os.replace(tmp_path, path)
+        except OSError as ex:
+            logger.warning(f"Could not write generation cache entry {path}: {ex}")
+            return
+        self._size = self.size() + len(data)
+        if self._size > self.max_size:
+            self.evict()
+
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(path.stat().st_size for path in self._entries())
+        return self._size
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache is 90% of max_size."""
+        entries = sorted(
+            ((path.stat(), path) for path in self._entries()),
+            key=lambda entry: entry[0].st_mtime,
+        )
+        size = sum(stat.st_size for stat, _ in entries)
+        for stat, path in entries:
+            if size <= 0.9 * self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+        self._size = size
+
+    def _entries(self) -> list[Path]:
+        return list(self.cache_dir.glob("*/*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+
+async def generate_loop(
+    model: Model,
+    role: str,
+    messages: list[ChatMessage],
+    cache: GenerationCache | None = None,
+    config: GenerateConfig = GenerateConfig(),
+    generate: GenerateFn | None = None,
+) -> tuple[list[ChatMessage], ModelOutput]:
+    """`Model.generate_loop` (or generate) going through cache when it's given."""
+    if cache is not None:
+        return await cache.generate_loop(model, role, messages, config, generate)
+    if generate is not None:
+        return await generate()
+    return await model.generate_loop(messages, config=config)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from inspect_ai.agent import AgentState
+from inspect_ai.model import ModelOutput
+from inspect_ai.solver._task_state import sample_state
+from inspect_ai.util import StoreModel, store_as
+
+from aspasia.cache import MESSAGES_ADAPTER
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[AgentState], Awaitable[AgentState]]
+
+
+class ResumedSteps(StoreModel):
+    """Protocol steps restored from the sample's checkpoint, saved in the sample
+    store. Their model calls are in the events of the earlier run's log, not in this
+    one's."""
+
+    num_steps: int = 0
+
+
+class CheckpointStore:
+    """Agent state and sample store after every protocol step, one JSON file per
+    sample and epoch.
+
+    Files are grouped by a hash of the run config, so a rerun with the same config
+    resumes samples from their last finished step and a changed config starts over.
+
+    Args:
+        directory: Directory with checkpoints.
+        config: Everything that changes protocol transcripts (protocol, models,
+            turns, prompts options...).
+    """
+
+    def __init__(self, directory: Path, config: dict[str, Any]) -> None:
+        config_hash = hashlib.sha256(
+            json.dumps(config, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        self.directory = directory / config_hash[:16]
+
+    def path(self, sample_id: str | int, epoch: int) -> Path:
+        return self.directory / f"{sample_id}_{epoch}.json"
+
+    def load(self, sample_id: str | int, epoch: int) -> dict[str, Any] | None:
+        path = self.path(sample_id, epoch)
+        try:
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {ex}")
+            return None
+
+    def save(
+        self, sample_id: str | int, epoch: int, checkpoint: dict[str, Any]
+    ) -> None:
+        path = self.path(sample_id, epoch)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(checkpoint, default=str))
+            os.replace(tmp_path, path)
+        except OSError as ex:
+            logger.warning(f"Could not write checkpoint {path}: {ex}")
+
+    def steps(self, state: AgentState) -> "ProtocolSteps":
+        """Steps of the running sample, restoring state from its checkpoint."""
+        current = sample_state()
+        if current is None:
+            return ProtocolSteps()
+        steps = ProtocolSteps(self, current.sample_id, current.epoch)
+        checkpoint = self.load(current.sample_id, current.epoch)
+        if checkpoint is not None:
+            state.messages = MESSAGES_ADAPTER.validate_python(checkpoint["messages"])
+            steps.outputs = [
+                ModelOutput.model_validate(output) for output in checkpoint["outputs"]
+            ]
+            for key, value in checkpoint.get("store", {}).items():
+                current.store.set(key, value)
+            store_as(ResumedSteps).num_steps = len(steps.outputs)
+        return steps
+
+
+class ProtocolSteps:
+    """Runs the steps of one sample's protocol, skipping the ones in its checkpoint.
+
+    A skipped step only restores its output, so decisions based on it (e.g. early
+    stopping) come out the same as in the first run. Records the protocol makes
+    between steps are rebuilt while skipping, so they are written idempotently.
+    """
+
+    def __init__(
+        self,
+        store: CheckpointStore | None = None,
+        sample_id: str | int = "",
+        epoch: int = 0,
+    ) -> None:
+        self.store = store
+        self.sample_id = sample_id
+        self.epoch = epoch
+        self.outputs: list[ModelOutput] = []
+        self._num_steps = 0
+
+    async def run(self, step: Step, state: AgentState) -> AgentState:
+        index = self._num_steps
+        self._num_steps += 1
+        if index < len(self.outputs):
+            state.output = self.outputs[index]
+            return state
+        state = await step(state)
+        if self.store is not None:
+            self.outputs.append(state.output)
+            current = sample_state()
+            self.store.save(
+                self.sample_id,
+                self.epoch,
+                {
+                    "messages": [message.model_dump() for message in state.messages],
+                    "outputs": [output.model_dump() for output in self.outputs],
+                    "store": dict(current.store.items()) if current else {},
+                },
+            )
+        return state
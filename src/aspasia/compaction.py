@@ -0,0 +1,147 @@
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from inspect_ai.model import (
+    ChatMessage,
+    ChatMessageSystem,
+    ChatMessageUser,
+    GenerateConfig,
+    Model,
+)
+from inspect_ai.util import StoreModel, store_as
+from pydantic import Field
+
+from aspasia.prompts import SUMMARY_PROMPT
+
+MAX_CACHED_MESSAGES = 100_000
+# characters kept of a message without arguments or quotes
+EXTRACT_MAX_CHARS = 400
+SUMMARY_CONFIG = GenerateConfig(temperature=0.0, max_tokens=150)
+
+CompactionMode = Literal["extract", "summary"]
+"""How older messages are shortened:
+
+- extract: only their `<argument>` and quotes are kept.
+- summary: a short summary by the judge model, made once per message.
+"""
+
+ARGUMENT_PATTERN = re.compile(r"<argument>(.*?)(?:</argument>|$)", re.DOTALL)
+# quotes, also ones marked by quote verification
+QUOTE_PATTERN = re.compile(r"<([uv]_|)quote>.*?</\1quote>", re.DOTALL)
+
+# (mode, message id, hash of text) -> compacted content and summary tokens
+_compacted: OrderedDict[tuple[str, str | None, int], tuple[str, int]] = OrderedDict()
+
+
+class JudgeCompaction(StoreModel):
+    """Estimated judge input tokens with and without compaction per judge turn,
+    saved in the sample store."""
+
+    turns: list[dict[str, Any]] = Field(default_factory=list)
+
+
+def estimate_tokens(messages: list[ChatMessage]) -> int:
+    return sum(len(message.text) for message in messages) // 4
+
+
+def extract(text: str) -> str:
+    """Arguments of text and quotes outside them, or its beginning when it has
+    neither."""
+    arguments = [argument.strip() for argument in ARGUMENT_PATTERN.findall(text)]
+    rest = ARGUMENT_PATTERN.sub("", text)
+    parts = arguments + [match.group(0) for match in QUOTE_PATTERN.finditer(rest)]
+    if parts:
+        return "\n".join(parts)
+    return text[:EXTRACT_MAX_CHARS] + ("..." if len(text) > EXTRACT_MAX_CHARS else "")
+
+
+@dataclass(frozen=True)
+class Compaction:
+    """Keeps the judge's input under a token budget.
+
+    When the judge's messages are over token_budget, agent messages older than the
+    last keep_messages are shortened oldest first until they fit, and dropped if
+    they still don't. The system prompt, question and article are always kept.
+
+    Args:
+        mode: How older messages are shortened, see `CompactionMode`.
+        token_budget: Estimated tokens (4 characters each) of the judge's input.
+        keep_messages: Latest agent messages always kept verbatim.
+    """
+
+    mode: CompactionMode = "extract"
+    token_budget: int = 4000
+    keep_messages: int = 2
+
+    async def compact(
+        self, messages: list[ChatMessage], model: Model, record: bool = True
+    ) -> list[ChatMessage]:
+        """Messages of a judge turn within the budget, summaries are generated by
+        model. With record, the tokens before and after are recorded in
+        `JudgeCompaction`."""
+        full_tokens = tokens = estimate_tokens(messages)
+        compacted = list(messages)
+        older = [
+            i
+            for i, message in enumerate(messages)
+            if message.metadata and "agent" in message.metadata
+        ][: -self.keep_messages or None]
+        num_compacted = summary_tokens = 0
+        for i in older:
+            if tokens <= self.token_budget:
+                break
+            content, new_tokens = await self.compacted_content(messages[i], model)
+            summary_tokens += new_tokens
+            if len(content) >= len(messages[i].text):
+                continue
+            compacted[i] = messages[i].model_copy(update={"content": content})
+            tokens += len(content) // 4 - len(messages[i].text) // 4
+            num_compacted += 1
+        dropped = set()
+        for i in older:
+            if tokens <= self.token_budget:
+                break
+            tokens -= len(compacted[i].text) // 4
+            dropped.add(i)
+        if record:
+            judge_compaction = store_as(JudgeCompaction)
+            judge_compaction.turns = [
+                *judge_compaction.turns,
+                {
+                    "full_tokens": full_tokens,
+                    "tokens": tokens,
+                    "compacted": num_compacted,
+                    "dropped": len(dropped),
+                    "summary_tokens": summary_tokens,
+                },
+            ]
+        return [message for i, message in enumerate(compacted) if i not in dropped]
+
+    async def compacted_content(
+        self, message: ChatMessage, model: Model
+    ) -> tuple[str, int]:
+        """Compacted content of message and tokens used to make it (0 if it was
+        cached, so every message is summarized once)."""
+        key = (self.mode, message.id, hash(message.text))
+        if key in _compacted:
+            _compacted.move_to_end(key)
+            return _compacted[key][0], 0
+        tokens = 0
+        if self.mode == "extract":
+            content = f"[Excerpt of an earlier message]\n{extract(message.text)}"
+        else:
+            output = await model.generate(
+                [
+                    ChatMessageSystem(content=SUMMARY_PROMPT),
+                    ChatMessageUser(content=message.text),
+                ],
+                config=SUMMARY_CONFIG,
+            )
+            content = f"[Summary of an earlier message]\n{output.completion.strip()}"
+            tokens = output.usage.total_tokens if output.usage else 0
+        _compacted[key] = (content, tokens)
+        if len(_compacted) > MAX_CACHED_MESSAGES:
+            _compacted.popitem(last=False)
+        return content, tokens
@@ -0,0 +1,72 @@
+import math
+import re
+from collections.abc import Sequence
+
+from inspect_ai.model import GenerateConfig, Logprob, ModelOutput
+
+# judge config needed to read answer probabilities from logprobs
+CONFIDENCE_CONFIG = GenerateConfig(logprobs=True, top_logprobs=5)
+
+ANSWER_PATTERN = re.compile(r"ANSWER\s*:\s*\(?([A-Z])\b")
+CONFIDENCE_PATTERN = re.compile(r"CONFIDENCE\s*:\s*(\d+(?:\.\d+)?)\s*%")
+
+
+def answer_probabilities(
+    output: ModelOutput, letters: Sequence[str] = ("A", "B")
+) -> dict[str, float] | None:
+    """Judge's probability of every answer letter, None when it can't be read.
+
+    Taken from the top logprobs of the token after the last 'ANSWER:' when the
+    provider returns logprobs, otherwise from the 'ANSWER: X' and 'CONFIDENCE: P%'
+    lines of the completion.
+    """
+    if not output.choices:
+        return None
+    logprobs = output.choices[0].logprobs
+    if logprobs is not None:
+        probabilities = logprob_answer_probabilities(logprobs.content, letters)
+        if probabilities is not None:
+            return probabilities
+    return parsed_answer_probabilities(output.completion, letters)
+
+
+def logprob_answer_probabilities(
+    content: list[Logprob], letters: Sequence[str]
+) -> dict[str, float] | None:
+    position = None
+    text = ""
+    for i, logprob in enumerate(content):
+        if logprob.token.strip() and text.rstrip().upper().endswith("ANSWER:"):
+            position = i
+        text += logprob.token
+    if position is None:
+        return None
+
+    return token_answer_probabilities(content[position], letters)
+
+
+def token_answer_probabilities(
+    answer: Logprob, letters: Sequence[str]
+) -> dict[str, float] | None:
+    """Probabilities of answer letters at one token, normalized over the letters."""
+    probabilities = dict.fromkeys(letters, 0.0)
+    for top in answer.top_logprobs or [answer]:
+        letter = top.token.strip().strip("(").upper()
+        if letter in probabilities:
+            probabilities[letter] += math.exp(top.logprob)
+    total = sum(probabilities.values())
+    if total == 0:
+        return None
+    return {letter: p / total for letter, p in probabilities.items()}
+
+
+def parsed_answer_probabilities(
+    completion: str, letters: Sequence[str]
+) -> dict[str, float] | None:
+    answers = ANSWER_PATTERN.findall(completion)
+    confidences = CONFIDENCE_PATTERN.findall(completion)
+    if not answers or not confidences or answers[-1] not in letters:
+        return None
+    confidence = min(float(confidences[-1]) / 100, 1.0)
+    rest = (1 - confidence) / (len(letters) - 1)
+    return {letter: confidence if letter == answers[-1] else rest for letter in letters}
@@ -1,3 +1,4 @@
+from .article_store import article_store, resolve_articles
 from .quality import QuALITY
 
-__all__ = ["QuALITY"]
+__all__ = ["QuALITY", "article_store", "resolve_articles"]
@@ -0,0 +1,63 @@
+import re
+
+from inspect_ai.model import ChatMessage
+
+ARTICLE_REFERENCE = "[[article:{article_id}]]"
+ARTICLE_REFERENCE_PATTERN = re.compile(r"\[\[article:(?P<article_id>[^\]]+)\]\]")
+
+
+class ArticleStore:
+    """Article texts keyed by `article_id`, shared by every sample of the process.
+
+    Samples and transcripts carry only an article reference; the text is looked up
+    here when a model input is built.
+    """
+
+    def __init__(self) -> None:
+        self._articles: dict[str, str] = {}
+
+    def update(self, articles: dict[str, str]) -> None:
+        self._articles.update(articles)
+
+    def get(self, article_id: str) -> str:
+        try:
+            return self._articles[article_id]
+        except KeyError:
+            raise KeyError(
+                f"{article_id=} is not in the article store. Load the dataset split "
+                "containing it before running the protocol."
+            ) from None
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._articles
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+
+article_store = ArticleStore()
+
+
+def article_reference(article_id: str) -> str:
+    return ARTICLE_REFERENCE.format(article_id=article_id)
+
+
+def resolve_articles(messages: list[ChatMessage]) -> list[ChatMessage]:
+    """Replace article references with the article text.
+
+    Only messages created with an article reference are copied, the rest of the list
+    is returned as is.
+    """
+    resolved = []
+    for message in messages:
+        if message.metadata and "article_id" in message.metadata:
+            article = article_store.get(message.metadata["article_id"])
+            message = message.model_copy(
+                update={
+                    "content": ARTICLE_REFERENCE_PATTERN.sub(
+                        lambda _: article, str(message.content)
+                    )
+                }
+            )
+        resolved.append(message)
+    return resolved
@@ -1,5 +1,12 @@
+import hashlib
+import itertools
 import json
+import logging
+import os
+import pickle
 import random
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal
@@ -7,19 +14,47 @@ from typing import Literal
 import numpy as np
 from inspect_ai.dataset import MemoryDataset, Sample
 
+from .article_store import article_store
+
+logger = logging.getLogger(__name__)
+
 SPLIT_TYPE = Literal["train", "dev", "test"]
 
+FILE_PREFIX = "QuALITY.v1.0.1.htmlstripped"
+CACHE_DIR_NAME = ".cache"
+# Bump whenever filtering or the cached layout changes to invalidate old caches.
+FILTER_VERSION = 3
+METADATA_COLUMNS = (
+    "article_id",
+    "set_unique_id",
+    "question_idx",
+    "title",
+    "year",
+    "author",
+    "topic",
+)
+
 
 @dataclass
 class QuALITYExample:
     metadata: dict[str, int | str]
-    article: str
     question: str
     answer: dict[str, str]
 
-    def to_sample(self) -> Sample:
+    @property
+    def sample_id(self) -> str:
+        """Stable across processes and machines, unique within the dataset."""
+        return f"{self.metadata['set_unique_id']}_{self.metadata['question_idx']}"
+
+    def to_sample(self, random_seed: int) -> Sample:
         choices_letters: list[str] = ["A", "B"]
-        gold_idx = random.randint(0, 1)
+        # seeded per question, so gold position doesn't depend on sample order or
+        # on which process builds the sample
+        rng = random.Random(
+            f"{random_seed}:{self.metadata['set_unique_id']}:"
+            f"{self.metadata['question_idx']}"
+        )
+        gold_idx = rng.randint(0, 1)
         if gold_idx == 0:
             choices = [self.answer["gold"], self.answer["best_distractor"]]
         else:
@@ -29,124 +64,366 @@ class QuALITYExample:
             metadata={
                 "answers": self.answer,
                 "letters": choices_letters,
-                "article": self.article,
                 "question": self.question,
                 "choices": choices,
                 "target": choices_letters[gold_idx],
                 **self.metadata,
             },
             input=self.question,
+            id=self.sample_id,
             target=choices_letters[gold_idx],
             choices=choices,
         )
 
 
+def is_labeled(question: dict) -> bool:
+    return "gold_label" in question
+
+
 class QuALITY:
     """QuALITY dataset with pre-processing described in the Debating with More
     Persuasive LLMs Leads to More Truthful Answers paper."""
 
-    def __init__(self, data_dir: Path, random_seed: int = 25) -> None:
+    def __init__(
+        self, data_dir: Path, random_seed: int = 25, use_cache: bool = True
+    ) -> None:
         if data_dir.is_dir() and not any(data_dir.iterdir()):
             raise FileNotFoundError(
                 f"{data_dir=} is empty. Download data before start!"
             )
         self.random_seed = random_seed
         self.data_dir = data_dir
+        self.use_cache = use_cache
         self.split: dict[str, list[QuALITYExample]] = {}
 
-    def prepare_datasets(self) -> None:
-        for split in ["train"]:
-            self._prepare_dataset_per_split(split)
+    def prepare_datasets(
+        self,
+        splits: Sequence[SPLIT_TYPE] = ("train", "dev"),
+        num_workers: int = 1,
+    ) -> None:
+        """Prepare splits, in parallel worker processes when num_workers > 1.
 
-    def _prepare_dataset_per_split(self, split: str) -> None:
-        with open(self.data_dir / f"QuALITY.v1.0.1.htmlstripped.{split}") as f:
+        Args:
+            splits: Splits to prepare, already prepared ones are skipped. The test
+                split has no labels, so it has no samples.
+            num_workers: Maximum number of processes preparing splits.
+        """
+        pending = [split for split in splits if split not in self.split]
+        if num_workers <= 1 or len(pending) <= 1:
+            for split in pending:
+                self._prepare_dataset_per_split(split)
+            return
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(pending))) as pool:
+            prepared = pool.map(
+                _load_split,
+                itertools.repeat(self.data_dir),
+                itertools.repeat(self.use_cache),
+                pending,
+            )
+            for split, (examples, articles) in zip(pending, prepared):
+                self._register_split(split, examples, articles)
+
+    def _prepare_dataset_per_split(
+        self, split: str, cache_path: Path | None = None
+    ) -> None:
+        self._register_split(split, *self._load_split(split, cache_path))
+
+    def _register_split(
+        self, split: str, examples: list[QuALITYExample], articles: dict[str, str]
+    ) -> None:
+        self.split[split] = examples
+        # article texts are kept once per article_id, samples refer to them by id
+        article_store.update(articles)
+
+    def _load_split(
+        self, split: str, cache_path: Path | None = None
+    ) -> tuple[list[QuALITYExample], dict[str, str]]:
+        """Examples and articles of split, from cache_path when given (to hash the
+        source file only once) or from its own cache file."""
+        if not self.use_cache:
+            return self._parse_split(split)
+        cache_path = cache_path or self._cache_path(split)
+        cached = self._load_cache(cache_path)
+        if cached is None:
+            cached = self._parse_split(split)
+            self._write_cache(cache_path, *cached)
+        return cached
+
+    def _source_path(self, split: str) -> Path:
+        return self.data_dir / f"{FILE_PREFIX}.{split}"
+
+    def _cache_path(self, split: str) -> Path:
+        """Cache file is keyed by source file content and FILTER_VERSION."""
+        with open(self._source_path(split), "rb") as f:
+            digest = hashlib.file_digest(f, "blake2b").hexdigest()[:16]
+        return (
+            self.data_dir
+            / CACHE_DIR_NAME
+            / f"{FILE_PREFIX}.{split}.{digest}.v{FILTER_VERSION}.pkl"
+        )
+
+    @staticmethod
+    def _load_cache(
+        cache_path: Path,
+    ) -> tuple[list[QuALITYExample], dict[str, str]] | None:
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            logger.warning(f"Ignoring unreadable QuALITY cache {cache_path}: {ex}")
+            return None
+        articles, columns = cached["articles"], cached["columns"]
+        examples = [
+            QuALITYExample(
+                metadata={key: columns[key][i] for key in METADATA_COLUMNS},
+                question=columns["question"][i],
+                answer={
+                    "gold": columns["gold"][i],
+                    "best_distractor": columns["best_distractor"][i],
+                },
+            )
+            for i in range(len(columns["question"]))
+        ]
+        return examples, articles
+
+    @staticmethod
+    def _write_cache(
+        cache_path: Path, examples: list[QuALITYExample], articles: dict[str, str]
+    ) -> None:
+        """Store examples column-wise next to the deduplicated articles."""
+        columns = {
+            key: [ex.metadata[key] for ex in examples] for key in METADATA_COLUMNS
+        }
+        columns["question"] = [ex.question for ex in examples]
+        columns["gold"] = [ex.answer["gold"] for ex in examples]
+        columns["best_distractor"] = [ex.answer["best_distractor"] for ex in examples]
+        try:
+            cache_path.parent.mkdir(exist_ok=True)
+            # drop caches of previous file versions of the same split
+            split_prefix = cache_path.name.rsplit(".", 3)[0]
+            for stale in cache_path.parent.glob(f"{split_prefix}.*.pkl"):
+                stale.unlink(missing_ok=True)
+            # write-then-rename, so concurrent workers never read a partial file
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {"articles": articles, "columns": columns},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, cache_path)
+        except OSError as ex:
+            logger.warning(f"Could not write QuALITY cache {cache_path}: {ex}")
+
+    def _parse_split(self, split: str) -> tuple[list[QuALITYExample], dict[str, str]]:
+        with open(self._source_path(split)) as f:
             data = [json.loads(line) for line in f]
+        if not any(is_labeled(q) for example in data for q in example["questions"]):
+            logger.warning(f"QuALITY {split} split has no labels, it has no samples")
+        return self._filter_articles(data)
+
+    def _stream_split(self, split: str) -> Iterator[QuALITYExample]:
+        """Parse and filter the split file one article at a time."""
+        with open(self._source_path(split)) as f:
+            for line in f:
+                examples, articles = self._filter_articles([json.loads(line)])
+                article_store.update(articles)
+                yield from examples
+
+    def _filter_articles(
+        self, data: list[dict]
+    ) -> tuple[list[QuALITYExample], dict[str, str]]:
+        data = [
+            example for example in data if self._filter_gutenberg_short_stories(example)
+        ]
+        questions = [
+            (example, question_idx, question)
+            for example in data
+            for question_idx, question in enumerate(example["questions"])
+            # questions of the public test split have no labels to filter by
+            if is_labeled(question)
+        ]
+        keep, best_distractor_idx = self._annotation_mask(
+            [question for _, _, question in questions]
+        )
         filtered_dataset = []
-        for example in data:
-            if not self._filter_gutenberg_short_stories(example):
-                continue
-            for question in example["questions"]:
-                if not self._filter_question_based_on_annotation(question):
-                    continue
-                # for some weird reason, they are indexed from 1
-                gold_answer = question["options"][question["gold_label"] - 1]
-                best_distractor = self._get_best_distractor(question)
-                prep_example = QuALITYExample(
-                    metadata={
-                        "article_id": example["article_id"],
-                        "set_unique_id": example["set_unique_id"],
-                        "title": example["title"],
-                        "year": example["year"],
-                        "author": example["author"],
-                        "topic": example["topic"],
-                    },
-                    article=example["article"],
-                    question=question["question"],
-                    answer={
-                        "gold": gold_answer,
-                        "best_distractor": best_distractor,
-                    },
-                )
-                filtered_dataset.append(prep_example)
+        articles = {}
+        for i in np.flatnonzero(keep):
+            example, question_idx, question = questions[i]
+            # for some weird reason, they are indexed from 1
+            gold_answer = question["options"][question["gold_label"] - 1]
+            best_distractor = question["options"][best_distractor_idx[i] - 1]
+            prep_example = QuALITYExample(
+                metadata={
+                    "article_id": example["article_id"],
+                    "set_unique_id": example["set_unique_id"],
+                    "question_idx": question_idx,
+                    "title": example["title"],
+                    "year": example["year"],
+                    "author": example["author"],
+                    "topic": example["topic"],
+                },
+                question=question["question"],
+                answer={
+                    "gold": gold_answer,
+                    "best_distractor": best_distractor,
+                },
+            )
+            filtered_dataset.append(prep_example)
+            articles[example["article_id"]] = example["article"]
 
-        self.split[split] = filtered_dataset
+        return filtered_dataset, articles
 
     def _filter_gutenberg_short_stories(self, example):
         """[...]We use only questions from the project Gutenberg short science[...]"""
         return "short stories" in example["topic"].lower()
 
-    def _filter_question_based_on_annotation(self, question: dict) -> bool:
-        "1. 100% of untimed annotators chose the correct answer"
-        true_label = question["gold_label"]
-        is_annot_answers_true = [
-            annot["untimed_answer"] == true_label for annot in question["validation"]
-        ]
-        coherent_answers: bool = all(is_annot_answers_true)
-        "2. Less than 50% of timed annotators chose the correct answer"
-        speed_annot_answers = [
-            annot["speed_answer"] == true_label
-            for annot in question["speed_validation"]
-        ]
-        timed_annot_wrong_half_time: bool = (
-            sum(speed_annot_answers) / len(speed_annot_answers)
-        ) < 0.5
-        "3.All untimed annotators agree that the question is answerable and unambiguous"
-        untimed_answerable_unambig: bool = all(
-            [
-                annot["untimed_eval1_answerability"] == 1
-                for annot in question["validation"]
-            ]
+    @staticmethod
+    def _annotation_mask(questions: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        """Apply the paper's annotation criteria to all questions at once.
+
+        Annotations are flattened into one array per field, each entry pointing back to
+        its question, and the criteria are computed as per-question reductions.
+
+        Returns:
+            Boolean mask of the questions passing all criteria and the 1-based option
+            index of the best distractor of every question.
+        """
+        n_questions = len(questions)
+        gold = np.array([q["gold_label"] for q in questions], dtype=np.int64)
+        writer = np.array([q["writer_label"] for q in questions], dtype=np.int64)
+
+        n_untimed = np.array([len(q["validation"]) for q in questions], dtype=np.int64)
+        untimed_owner = np.repeat(np.arange(n_questions), n_untimed)
+        untimed = [annot for q in questions for annot in q["validation"]]
+        untimed_answer = np.array(
+            [a["untimed_answer"] for a in untimed], dtype=np.int64
         )
-        "4. Average ”context required” rating from untimed annotators is at least 1.5"
-        avg_context_more_eq_1_5: bool = bool(
-            np.mean(
-                [annot["untimed_eval2_context"] for annot in question["validation"]]
-            )
-            >= 1.5
+        answerability = np.array(
+            [a["untimed_eval1_answerability"] for a in untimed], dtype=np.int64
         )
-        "5. Writer label matches the gold label"
-        writer_label_coherent: bool = question["writer_label"] == true_label
-        return (
+        context = np.array(
+            [a["untimed_eval2_context"] for a in untimed], dtype=np.float64
+        )
+        distractor = np.array(
+            [a["untimed_best_distractor"] for a in untimed], dtype=np.int64
+        )
+
+        n_speed = np.array(
+            [len(q["speed_validation"]) for q in questions], dtype=np.int64
+        )
+        speed_owner = np.repeat(np.arange(n_questions), n_speed)
+        speed_answer = np.array(
+            [a["speed_answer"] for q in questions for a in q["speed_validation"]],
+            dtype=np.int64,
+        )
+
+        def count_per_question(owner: np.ndarray, values: np.ndarray) -> np.ndarray:
+            return np.bincount(owner, weights=values, minlength=n_questions)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # 1. 100% of untimed annotators chose the correct answer
+            coherent_answers = (
+                count_per_question(untimed_owner, untimed_answer != gold[untimed_owner])
+                == 0
+            )
+            # 2. Less than 50% of timed annotators chose the correct answer
+            timed_annot_wrong_half_time = (
+                count_per_question(speed_owner, speed_answer == gold[speed_owner])
+                / n_speed
+            ) < 0.5
+            # 3. All untimed annotators agree that the question is answerable and
+            # unambiguous
+            untimed_answerable_unambig = (
+                count_per_question(untimed_owner, answerability != 1) == 0
+            )
+            # 4. Average ”context required” rating from untimed annotators is at
+            # least 1.5
+            avg_context_more_eq_1_5 = (
+                count_per_question(untimed_owner, context) / n_untimed
+            ) >= 1.5
+        # 5. Writer label matches the gold label
+        writer_label_coherent = writer == gold
+
+        keep = (
             coherent_answers
-            and timed_annot_wrong_half_time
-            and untimed_answerable_unambig
-            and avg_context_more_eq_1_5
-            and writer_label_coherent
+            & timed_annot_wrong_half_time
+            & untimed_answerable_unambig
+            & avg_context_more_eq_1_5
+            & writer_label_coherent
         )
 
-    def _get_best_distractor(self, question: dict) -> str:
-        best_distractor_candidates = [
-            annot["untimed_best_distractor"] for annot in question["validation"]
-        ]
-        best_distractor_idx = max(
-            best_distractor_candidates,
-            key=lambda x: best_distractor_candidates.count(x),
+        # Best distractor is the most voted one, ties go to the earliest vote
+        n_labels = int(distractor.max(initial=0)) + 1
+        votes = np.zeros((n_questions, n_labels), dtype=np.int64)
+        np.add.at(votes, (untimed_owner, distractor), 1)
+        vote_position = np.arange(len(untimed)) - np.repeat(
+            np.cumsum(n_untimed) - n_untimed, n_untimed
         )
-        best_distractor_idx -= 1  # for some weird reason, they are indexed from 1
-        return question["options"][best_distractor_idx]
-
-    def get_memory_dataset(self, split: SPLIT_TYPE) -> MemoryDataset:
-        if self.split.get(split) is None:
-            self._prepare_dataset_per_split(split)
-        converted_dataset = [example.to_sample() for example in self.split[split]]
-        return MemoryDataset(converted_dataset)
+        first_vote = np.full((n_questions, n_labels), len(untimed), dtype=np.int64)
+        np.minimum.at(first_vote, (untimed_owner, distractor), vote_position)
+        ranking = votes * (len(untimed) + 1) - first_vote
+        best_distractor_idx = ranking.argmax(axis=1)
+        return keep, best_distractor_idx
+
+    def iter_samples(
+        self,
+        split: SPLIT_TYPE,
+        limit: int | None = None,
+        offset: int = 0,
+        shard: tuple[int, int] | None = None,
+    ) -> Iterator[Sample]:
+        """Lazily yield filtered samples of the split.
+
+        Unless the split is already prepared, the file is parsed one article at a
+        time while samples are consumed, so the split is never held in memory and
+        parsing stops once limit is reached.
+
+        Args:
+            split: Dataset split.
+            limit: Maximum number of samples to yield.
+            offset: Number of samples to skip (after sharding).
+            shard: (k, n) to keep only every n-th sample starting from the k-th one.
+        """
+        if split in self.split:
+            examples: Iterable[QuALITYExample] = self.split[split]
+        else:
+            examples = self._stream_split(split)
+        if shard is not None:
+            k, n = shard
+            if not 0 <= k < n:
+                raise ValueError(f"Shard index must be in [0, {n}), got {k}")
+            examples = itertools.islice(examples, k, None, n)
+        stop = None if limit is None else offset + limit
+        for example in itertools.islice(examples, offset, stop):
+            yield example.to_sample(self.random_seed)
+
+    def get_memory_dataset(
+        self,
+        split: SPLIT_TYPE,
+        limit: int | None = None,
+        offset: int = 0,
+        shard: tuple[int, int] | None = None,
+    ) -> MemoryDataset:
+        """Dataset of the split, optionally restricted as in `iter_samples`.
+
+        Inspect tasks need all their samples up front, so samples are materialized
+        and evaluation doesn't start before parsing ends (the runners don't stream).
+        Streaming only saves work for a limited load of a split that isn't cached
+        yet, parsing stops once limit samples are found. Other loads prepare the
+        whole split through the on-disk cache.
+        """
+        if split not in self.split:
+            cache_path = self._cache_path(split) if self.use_cache else None
+            if limit is None or (cache_path is not None and cache_path.exists()):
+                self._prepare_dataset_per_split(split, cache_path)
+        return MemoryDataset(list(self.iter_samples(split, limit, offset, shard)))
+
+
+def _load_split(
+    data_dir: Path, use_cache: bool, split: str
+) -> tuple[list[QuALITYExample], dict[str, str]]:
+    """Worker entry point of QuALITY.prepare_datasets."""
+    return QuALITY(data_dir, use_cache=use_cache)._load_split(split)
@@ -0,0 +1,70 @@
+from collections.abc import Sequence
+from pathlib import Path
+
+from inspect_ai.dataset import MemoryDataset, Sample
+from inspect_ai.log import EvalSample, ModelEvent, list_eval_logs, read_eval_log
+from inspect_ai.model import ChatMessage, ChatMessageAssistant
+
+
+def agent_of(message: ChatMessage, judge_completions: set[str]) -> str | None:
+    """Agent that wrote message, from its metadata or, for logs from before agents
+    tagged their messages, from completions of judge role model calls."""
+    if message.metadata and "agent" in message.metadata:
+        return message.metadata["agent"]
+    if isinstance(message, ChatMessageAssistant) and message.text in judge_completions:
+        return "judge"
+    return None
+
+
+def sample_transcript(
+    sample: EvalSample, drop_agents: Sequence[str] = ("judge",)
+) -> list[ChatMessage]:
+    """Messages of a logged sample without the ones written by drop_agents."""
+    judge_completions = {
+        event.output.completion
+        for event in sample.events
+        if isinstance(event, ModelEvent) and event.role == "judge"
+    }
+    return [
+        message
+        for message in sample.messages
+        if agent_of(message, judge_completions) not in drop_agents
+    ]
+
+
+def transcript_dataset(
+    log_path: str, drop_agents: Sequence[str] = ("judge",)
+) -> MemoryDataset:
+    """Transcripts of the samples in an eval log (or a directory of them) without the
+    messages of drop_agents, e.g. to run a new judge over finished debates.
+
+    Samples that errored are skipped. Ids are `{sample id}_{epoch}`, prefixed with
+    the log name when several logs are read.
+    """
+    path = Path(log_path)
+    logs = (
+        [log.name for log in list_eval_logs(str(path))] if path.is_dir() else [log_path]
+    )
+    samples = []
+    for log_file in logs:
+        log = read_eval_log(log_file)
+        for sample in log.samples or []:
+            if sample.error is not None:
+                continue
+            sample_id = f"{sample.id}_{sample.epoch}"
+            samples.append(
+                Sample(
+                    input=sample_transcript(sample, drop_agents),
+                    target=sample.target,
+                    choices=sample.choices,
+                    id=f"{Path(log_file).stem}/{sample_id}"
+                    if len(logs) > 1
+                    else sample_id,
+                    metadata={
+                        **(sample.metadata or {}),
+                        "source_log": log_file,
+                        "source_sample_id": sample.id,
+                    },
+                )
+            )
+    return MemoryDataset(samples, name=path.stem, location=log_path)
@@ -2,20 +2,34 @@ from __future__ import annotations
 
 import json
 import os
+import re
 import subprocess
 import tempfile
-from collections.abc import Iterable
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
 from dataclasses import asdict, is_dataclass
 from typing import Any
 
+import anyio
+from inspect_ai.util import concurrency, input_screen
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.rule import Rule
+from rich.segment import Segments
 from rich.text import Text
 
 # ---------- Rendering helpers ----------
 
+# longer string contents are shown collapsed until expanded with /expand N
+COLLAPSE_AFTER_CHARS = 2000
+MAX_CACHED_PANELS = 4096
+EXPAND_COMMAND = re.compile(r"^/expand\s+(\d+)$")
+
+# (message id, index, show_index, console width, expanded) -> rendered panel
+_panel_cache: OrderedDict[tuple[str, int, bool, int, bool], Segments] = OrderedDict()
+
 ROLE_STYLES = {
     "system": "bold white on grey19",
     "developer": "bold white on dark_magenta",
@@ -84,49 +98,111 @@ def _render_content_to_console(console: Console, content: Any) -> None:
     console.print(Panel(_safe_to_str(content), border_style="grey39"))
 
 
+def _message_panel(
+    console: Console, message: Any, index: int, *, show_index: bool, expanded: bool
+) -> Panel:
+    role = getattr(message, "role", "assistant") or "assistant"
+    role_style = ROLE_STYLES.get(role, "bold white on grey27")
+    role_badge = Text(f" {role.upper()} ", style=role_style)
+
+    # Optional: show tags if present (e.g., message.metadata.get("tags"))
+    subtitle = None
+    meta = getattr(message, "metadata", None)
+    if isinstance(meta, dict):
+        tags = meta.get("tags") or meta.get("tag") or None
+        if tags:
+            if isinstance(tags, list | tuple | set):
+                subtitle = f"tags: {', '.join(map(str, tags))}"
+            else:
+                subtitle = f"tags: {tags}"
+
+    title = role_badge
+    if show_index:
+        title.append(f"  #{index}", style="bold dim")
+
+    content = getattr(message, "content", "")
+    collapsed = (
+        not expanded
+        and isinstance(content, str)
+        and len(content) > COLLAPSE_AFTER_CHARS
+    )
+    if collapsed:
+        subtitle = f"{subtitle} • " if subtitle else ""
+        subtitle += (
+            f"{len(content) - COLLAPSE_AFTER_CHARS:,} more chars: /expand {index}"
+        )
+        content = content[:COLLAPSE_AFTER_CHARS] + " …"
+
+    with console.capture() as cap:
+        _render_content_to_console(console, content)
+
+    # Wrap captured markdown render in a panel for consistent layout
+    body = cap.get()
+    return Panel.fit(
+        body if body.strip() else "[dim]∅ empty[/dim]",
+        title=title,
+        subtitle=subtitle,
+        border_style="grey35",
+        padding=(1, 2),
+    )
+
+
+def _rendered_message(
+    console: Console,
+    message: Any,
+    index: int,
+    *,
+    show_index: bool = True,
+    expanded: bool = False,
+) -> Segments:
+    """Message panel rendered for the console width, cached per message id."""
+    message_id = getattr(message, "id", None)
+    key = (message_id, index, show_index, console.width, expanded)
+    rendered = _panel_cache.get(key) if message_id is not None else None
+    if rendered is None:
+        panel = _message_panel(
+            console, message, index, show_index=show_index, expanded=expanded
+        )
+        rendered = Segments(console.render(panel))
+        if message_id is not None:
+            _panel_cache[key] = rendered
+            if len(_panel_cache) > MAX_CACHED_PANELS:
+                _panel_cache.popitem(last=False)
+    else:
+        _panel_cache.move_to_end(key)
+    return rendered
+
+
 def display_chat_history_in_console(
     console: Console,
     messages: list,
     *,
     show_index: bool = True,
 ) -> None:
+    """Redraw the conversation, only messages not drawn before are rendered.
+
+    Long messages are collapsed, see `expand_message`.
+    """
     console.clear()
     console.print(Rule("[bold]Conversation[/bold]"))
     for i, message in enumerate(messages, start=1):
-        role = getattr(message, "role", "assistant") or "assistant"
-        role_style = ROLE_STYLES.get(role, "bold white on grey27")
-        role_badge = Text(f" {role.upper()} ", style=role_style)
-
-        # Optional: show tags if present (e.g., message.metadata.get("tags"))
-        subtitle = None
-        meta = getattr(message, "metadata", None)
-        if isinstance(meta, dict):
-            tags = meta.get("tags") or meta.get("tag") or None
-            if tags:
-                if isinstance(tags, list | tuple | set):
-                    subtitle = f"tags: {', '.join(map(str, tags))}"
-                else:
-                    subtitle = f"tags: {tags}"
-
-        title = role_badge
-        if show_index:
-            title.append(f"  #{i}", style="bold dim")
+        console.print(_rendered_message(console, message, i, show_index=show_index))
+    console.print()  # bottom spacing
 
-        with console.capture() as cap:
-            _render_content_to_console(console, getattr(message, "content", ""))
 
-        # Wrap captured markdown render in a panel for consistent layout
-        body = cap.get()
+def expand_message(console: Console, messages: list, reply: str) -> bool:
+    """Print message N in full if reply is '/expand N', returns whether it was."""
+    match = EXPAND_COMMAND.match(reply.strip())
+    if match is None:
+        return False
+    index = int(match.group(1))
+    if 1 <= index <= len(messages):
         console.print(
-            Panel.fit(
-                body if body.strip() else "[dim]∅ empty[/dim]",
-                title=title,
-                subtitle=subtitle,
-                border_style="grey35",
-                padding=(1, 2),
-            )
+            _rendered_message(console, messages[index - 1], index, expanded=True)
         )
-    console.print()  # bottom spacing
+    else:
+        console.print(f"[red]No message #{index}[/red]")
+    return True
 
 
 # ---------- Input helpers ----------
@@ -168,15 +244,19 @@ def _multiline_input(console: Console, prompt: str) -> str:
     return "\n".join(lines).strip()
 
 
-def prompt_for_reply(console: Console, prompt: str = "Your reply>") -> str:
+def prompt_for_reply(
+    console: Console, prompt: str = "Your reply>", messages: list | None = None
+) -> str:
     console.print(
         Panel.fit(
             "Reply options: [b]/ml[/b] multi-line • [b]/edit[/b] open $EDITOR • "
-            "[b]/skip[/b] submit empty",
+            "[b]/skip[/b] submit empty • [b]/expand N[/b] show message N in full",
             border_style="grey35",
         )
     )
     first = console.input(f"[bold]{prompt}[/bold] ").strip()
+    while messages is not None and expand_message(console, messages, first):
+        first = console.input(f"[bold]{prompt}[/bold] ").strip()
 
     if first == "/skip":
         return ""
@@ -191,4 +271,61 @@ def prompt_for_reply(console: Console, prompt: str = "Your reply>") -> str:
     return first
 
 
+def input_reply(console: Console, messages: list) -> str:
+    reply = console.input("Write your reply:")
+    while expand_message(console, messages, reply):
+        reply = console.input("Write your reply:")
+    return reply
+
+
 # ---------- Agent ----------
+
+HUMAN_JUDGE_QUEUE = "human_judge"
+
+
+async def ask_human(
+    messages: list, read_reply: Callable[[Console, list], str] = input_reply
+) -> str:
+    """Show messages to the human judge and return their reply.
+
+    Samples are queued for the human judge and served one at a time in arrival
+    order. Console input runs in a worker thread, so while the human reads and
+    types (and the input screen hides the eval display) the event loop keeps
+    generating turns of other samples.
+
+    A blocking read can't be interrupted, so when the sample is cancelled (time
+    limit, cancelled eval) the read is abandoned: the screen and the queue are
+    released right away, and the abandoned thread consumes the next line typed.
+    """
+    async with concurrency(HUMAN_JUDGE_QUEUE, 1):
+        with input_screen(transient=False) as console:
+            display_chat_history_in_console(console, messages)
+            return await _read_in_daemon_thread(lambda: read_reply(console, messages))
+
+
+async def _read_in_daemon_thread(read: Callable[[], str]) -> str:
+    """Run a blocking read in a daemon thread.
+
+    A cancelled caller stops waiting right away, and unlike `anyio.to_thread`
+    workers an abandoned read doesn't keep the process alive at exit.
+    """
+    token = anyio.lowlevel.current_token()
+    done = anyio.Event()
+    result: list[str] = []
+    error: list[BaseException] = []
+
+    def target() -> None:
+        try:
+            result.append(read())
+        except BaseException as ex:
+            error.append(ex)
+        try:
+            anyio.from_thread.run_sync(done.set, token=token)
+        except RuntimeError:
+            pass  # the event loop has finished, nobody waits for the reply
+
+    threading.Thread(target=target, name="human judge input", daemon=True).start()
+    await done.wait()
+    if error:
+        raise error[0]
+    return result[0]
@@ -0,0 +1,389 @@
+"""Local web server for human judges.
+
+Judge turns of all samples go into one queue. Every judge opens the page (or runs a
+scripted client), gets a session and leases pending turns one at a time; the reply
+is handed back to the sample's protocol coroutine. A lease that isn't answered in
+time and turns leased by sessions that went quiet go back to the queue. The server
+stops when its task ends, so the next eval in the process can bind the port again.
+
+Scripted judges for testing:
+python -m aspasia.judge_server --url http://127.0.0.1:8000 --judges 3
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+
+import anyio
+from aiohttp import ClientConnectionError, ClientSession, web
+from inspect_ai.hooks import Hooks, TaskEnd, hooks
+from inspect_ai.model import ChatMessage
+
+# how long GET /api/next waits for a pending turn before returning 204
+LONG_POLL_SECONDS = 20.0
+
+# servers listening, stopped by `StopJudgeServers` when their task ends
+_running: "weakref.WeakSet[JudgeServer]" = weakref.WeakSet()
+
+
+@dataclass
+class JudgeSession:
+    name: str
+    last_seen: float = field(default_factory=time.monotonic)
+    num_replies: int = 0
+
+
+@dataclass(eq=False)
+class PendingTurn:
+    sample_id: str | int | None
+    messages: list[dict[str, str]]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    session_id: str | None = None
+    lease_deadline: float = 0.0
+    reply: str | None = None
+    judge: str | None = None
+    done: anyio.Event = field(default_factory=anyio.Event)
+
+
+class JudgeServer:
+    """Shared queue of judge turns served over HTTP.
+
+    Runs in the eval's (asyncio) event loop, starts with the first judge turn and
+    stops at the end of the task.
+
+    Args:
+        host: Interface to listen on.
+        port: Port to listen on.
+        lease_timeout: Seconds a judge has to reply to a leased turn.
+        session_timeout: Seconds without requests after which a judge's session is
+            dropped and its turn goes back to the queue.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        lease_timeout: float = 600.0,
+        session_timeout: float = 120.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.lease_timeout = lease_timeout
+        self.session_timeout = session_timeout
+        self.sessions: dict[str, JudgeSession] = {}
+        self.queue: deque[PendingTurn] = deque()
+        self.leased: dict[str, PendingTurn] = {}
+        self._changed = asyncio.Event()
+        self._runner: web.AppRunner | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping = False
+
+    async def ask(
+        self, messages: list[ChatMessage], sample_id: str | int | None = None
+    ) -> tuple[str, str]:
+        """Queue a judge turn and wait for a reply, returns reply and judge name."""
+        await self.start()
+        turn = PendingTurn(
+            sample_id=sample_id,
+            messages=[
+                {"role": message.role, "content": message.text} for message in messages
+            ],
+        )
+        self.queue.append(turn)
+        self._notify()
+        try:
+            await turn.done.wait()
+        finally:
+            if not turn.done.is_set():  # sample cancelled
+                self._discard(turn)
+        assert turn.reply is not None and turn.judge is not None
+        return turn.reply, turn.judge
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._runner is not None and self._loop is loop:
+            return
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self._stopping = False
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        _running.add(self)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/", self.index),
+                web.post("/api/sessions", self.create_session),
+                web.get("/api/next", self.next_turn),
+                web.post("/api/turns/{turn_id}", self.submit_reply),
+                web.get("/api/status", self.status),
+            ]
+        )
+        return app
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            # end long polls right away instead of waiting for them in cleanup
+            self._stopping = True
+            self._notify()
+            await self._runner.cleanup()
+            self._runner = None
+        _running.discard(self)
+
+    @property
+    def idle(self) -> bool:
+        """No turn is pending or leased."""
+        return not self.queue and not self.leased
+
+    def lease(self, session_id: str) -> PendingTurn | None:
+        self.expire()
+        if not self.queue:
+            return None
+        turn = self.queue.popleft()
+        turn.session_id = session_id
+        turn.lease_deadline = time.monotonic() + self.lease_timeout
+        self.leased[turn.id] = turn
+        return turn
+
+    def expire(self) -> None:
+        """Drop quiet sessions and requeue turns with expired leases."""
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_seen > self.session_timeout:
+                del self.sessions[session_id]
+        for turn in list(self.leased.values()):
+            if turn.lease_deadline < now or turn.session_id not in self.sessions:
+                del self.leased[turn.id]
+                turn.session_id = None
+                self.queue.appendleft(turn)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _discard(self, turn: PendingTurn) -> None:
+        self.leased.pop(turn.id, None)
+        if turn in self.queue:
+            self.queue.remove(turn)
+
+    def _session(self, request: web.Request, session_id: str) -> JudgeSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise web.HTTPUnauthorized(text="Unknown or expired session")
+        session.last_seen = time.monotonic()
+        return session
+
+    async def index(self, request: web.Request) -> web.Response:
+        return web.Response(text=INDEX_HTML, content_type="text/html")
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = JudgeSession(name=body.get("name") or session_id)
+        return web.json_response({"session_id": session_id})
+
+    async def next_turn(self, request: web.Request) -> web.Response:
+        session_id = request.query.get("session", "")
+        self._session(request, session_id)
+        deadline = time.monotonic() + float(
+            request.query.get("wait", LONG_POLL_SECONDS)
+        )
+        while (turn := self.lease(session_id)) is None:
+            changed = self._changed
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping:
+                return web.Response(status=204)
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, 1.0))
+            except TimeoutError:
+                pass
+            self._session(request, session_id)
+        return web.json_response(
+            {
+                "turn_id": turn.id,
+                "sample_id": turn.sample_id,
+                "messages": turn.messages,
+                "lease_timeout": self.lease_timeout,
+            }
+        )
+
+    async def submit_reply(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        session = self._session(request, body.get("session", ""))
+        turn = self.leased.get(request.match_info["turn_id"])
+        if turn is None or turn.session_id != body["session"]:
+            raise web.HTTPConflict(text="Turn is not leased by this session")
+        del self.leased[turn.id]
+        turn.reply = str(body["reply"])
+        turn.judge = session.name
+        session.num_replies += 1
+        turn.done.set()
+        return web.json_response({"ok": True})
+
+    async def status(self, request: web.Request) -> web.Response:
+        self.expire()
+        return web.json_response(
+            {
+                "pending": len(self.queue),
+                "leased": len(self.leased),
+                "judges": {
+                    session.name: session.num_replies
+                    for session in self.sessions.values()
+                },
+            }
+        )
+
+
+INDEX_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>aspasia judge</title>
+<style>
+body { font-family: sans-serif; max-width: 60em; margin: 2em auto; }
+.message { border: 1px solid #ccc; border-radius: 4px; margin: 0.5em 0;
+  padding: 0.5em; white-space: pre-wrap; }
+.role { font-weight: bold; }
+textarea { width: 100%; height: 8em; }
+</style></head>
+<body>
+<h2>aspasia judge <small id="status"></small></h2>
+<div id="turn"></div>
+<script>
+let session = null, turn = null, name = null;
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+async function start() {
+  if (name === null) name = prompt("Your name") || "";
+  while (true) {  // the server is down between tasks
+    try {
+      const r = await fetch("/api/sessions", {method: "POST",
+        body: JSON.stringify({name})});
+      session = (await r.json()).session_id;
+      break;
+    } catch (e) { await sleep(2000); }
+  }
+  next();
+}
+async function next() {
+  document.getElementById("turn").innerHTML = "Waiting for the next turn...";
+  while (true) {
+    let r;
+    try { r = await fetch(`/api/next?session=${session}`); }
+    catch (e) { await sleep(2000); continue; }
+    if (r.status === 200) { turn = await r.json(); break; }
+    if (r.status === 401) { return start(); }
+  }
+  const div = document.getElementById("turn");
+  div.innerHTML = `<p>Sample ${turn.sample_id}</p>`;
+  for (const m of turn.messages) {
+    const el = m.content.length > 2000
+      ? document.createElement("details") : document.createElement("div");
+    el.className = "message";
+    el.innerHTML = m.content.length > 2000
+      ? `<summary class="role">${m.role} (${m.content.length} chars)</summary>`
+      : `<div class="role">${m.role}</div>`;
+    el.append(document.createTextNode(m.content));
+    div.append(el);
+  }
+  div.insertAdjacentHTML("beforeend",
+    '<textarea id="reply"></textarea><button onclick="submit()">Submit</button>');
+}
+async function submit() {
+  const reply = document.getElementById("reply").value;
+  const r = await fetch(`/api/turns/${turn.turn_id}`, {method: "POST",
+    body: JSON.stringify({session, reply})});
+  if (r.status !== 200) alert(await r.text());
+  next();
+}
+start();
+</script></body></html>
+"""
+
+
+async def scripted_judge(
+    url: str,
+    name: str,
+    reply: str,
+    think_time: float = 0.0,
+    max_turns: int = 0,
+    connect_timeout: float = 60.0,
+) -> int:
+    """Judge that answers every turn with reply, until the server stops, no turn
+    comes within the long poll or after max_turns (0 for no limit).
+
+    Returns the number of replies.
+    """
+    num_replies = 0
+    async with ClientSession(url) as client:
+        deadline = time.monotonic() + connect_timeout
+        while True:  # the server starts with the first judge turn
+            try:
+                async with client.post(
+                    "/api/sessions", json={"name": name}
+                ) as response:
+                    session_id = (await response.json())["session_id"]
+                break
+            except ClientConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.5)
+        try:
+            while not max_turns or num_replies < max_turns:
+                async with client.get(
+                    "/api/next", params={"session": session_id}
+                ) as response:
+                    if response.status == 204:
+                        break
+                    turn = await response.json()
+                await asyncio.sleep(think_time)
+                async with client.post(
+                    f"/api/turns/{turn['turn_id']}",
+                    json={"session": session_id, "reply": reply},
+                ) as response:
+                    response.raise_for_status()
+                num_replies += 1
+        except ClientConnectionError:
+            pass  # eval finished
+    return num_replies
+
+
+@hooks(
+    name="aspasia_judge_servers",
+    description="Stops the judge servers of a task when it ends.",
+)
+class StopJudgeServers(Hooks):
+    async def on_task_end(self, data: TaskEnd) -> None:
+        loop = asyncio.get_running_loop()
+        # servers of other tasks running in this loop still have turns, or start
+        # again with their next one
+        for server in list(_running):
+            if server._loop is loop and server.idle:
+                await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scripted judges for a judge server")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--judges", type=int, default=1)
+    parser.add_argument("--reply", default="ANSWER: A")
+    parser.add_argument("--think-time", type=float, default=0.0)
+    args = parser.parse_args()
+
+    async def run() -> list[int]:
+        return await asyncio.gather(
+            *(
+                scripted_judge(args.url, f"judge_{i}", args.reply, args.think_time)
+                for i in range(args.judges)
+            )
+        )
+
+    for i, num_replies in enumerate(asyncio.run(run())):
+        print(f"judge_{i}: {num_replies} replies")
+
+
+if __name__ == "__main__":
+    main()
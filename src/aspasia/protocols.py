@@ -1,9 +1,59 @@
+from dataclasses import dataclass, field
+from functools import partial
 from typing import Literal
 
 from inspect_ai.agent import Agent, AgentState, agent, run
+from inspect_ai.model import GenerateConfig
+from inspect_ai.util import StoreModel, collect, store_as
+from pydantic import Field
 
-from aspasia.agents import consultant_agent, judge_agent
-from aspasia.prompts import CONSULTANT_JUDGE_PROMPT, CONSULTANT_PROMPT
+from aspasia.agents import MessageLayout, consultant_agent, judge_agent
+from aspasia.cache import GenerationCache
+from aspasia.checkpoints import CheckpointStore, ProtocolSteps
+from aspasia.compaction import Compaction
+from aspasia.confidence import CONFIDENCE_CONFIG, answer_probabilities
+from aspasia.prompts import (
+    CONSULTANT_JUDGE_PROMPT,
+    CONSULTANT_PROMPT,
+    JUDGE_CONFIDENCE_PROMPT,
+    JUDGE_QUOTE_PROMPT,
+    QUOTE_PROMPT,
+)
+from aspasia.telemetry import turn_span
+
+
+class DebateSweep(StoreModel):
+    """Final judge reply of every config of a debate sweep and the protocol steps
+    run, compared to running the configs separately, saved in the sample store."""
+
+    answers: dict[str, str] = Field(default_factory=dict)
+    steps_run: int = 0
+    steps_separate: int = 0
+
+
+class EarlyStopping(StoreModel):
+    """Judge's confidence after every turn and turns skipped, saved in the sample
+    store."""
+
+    confidences: list[float | None] = Field(default_factory=list)
+    turns_run: int = 0
+    turns_saved: int = 0
+
+
+def judge_is_confident(state: AgentState, threshold: float, turn: int) -> bool:
+    """Whether the judge's last answer passes threshold, recording its confidence
+    as the one of turn."""
+    probabilities = answer_probabilities(state.output)
+    confidence = max(probabilities.values()) if probabilities else None
+    early_stopping = store_as(EarlyStopping)
+    early_stopping.confidences = [*early_stopping.confidences[:turn], confidence]
+    return confidence is not None and confidence >= threshold
+
+
+def record_turns(num_turns: int, turns_run: int) -> None:
+    early_stopping = store_as(EarlyStopping)
+    early_stopping.turns_run = turns_run
+    early_stopping.turns_saved = num_turns - turns_run
 
 
 @agent
@@ -12,28 +62,75 @@ def consultancy(
     interactive: bool = False,
     symmetric: bool = False,
     consultant_side: Literal["target", "random"] = "target",
+    cache: GenerationCache | None = None,
+    layout: MessageLayout = "inline",
+    best_of_n: int = 1,
+    config: GenerateConfig = GenerateConfig(),
+    early_stop_threshold: float | None = None,
+    checkpoints: CheckpointStore | None = None,
+    verify_quotes: float | None = None,
+    compaction: Compaction | None = None,
 ) -> Agent:
     """
 
     Args:
     interactive: bool - Use human as a judge. When False, using LLM as a judge.
     symmetric: bool - When True judge has access to all information that consultant,
-                except consultant's thinking (text in <thinking> </thinking> tags)
+                except consultant's text outside <argument> tags and quotes
+                (e.g. <thinking>)
+    cache: GenerationCache | None - Disk cache for consultant and judge generations.
+    layout: MessageLayout - Where the consultant's side goes, "prefix" keeps the
+                history a stable prefix for provider prompt caching.
+    best_of_n: int - Number of candidate consultant arguments per turn, the judge
+                model picks the most persuasive one.
+    config: GenerateConfig - Generate config of consultant and judge turns.
+    early_stop_threshold: float | None - Stop once the judge's probability of its
+                answer reaches the threshold, read from logprobs or from the
+                confidence it's asked to state.
+    checkpoints: CheckpointStore | None - Save state after every consultant and judge
+                turn, a rerun continues from the last saved turn.
+    verify_quotes: float | None - Ask the consultant to tag quotes and mark them as
+                verified or unverified for the judge, see `judge_agent`.
+    compaction: Compaction | None - Keep the judge's input under a token budget by
+                shortening older turns, see `Compaction`.
     """
 
     consultant = consultant_agent(
-        agent_prompt=CONSULTANT_PROMPT,
+        agent_prompt=CONSULTANT_PROMPT
+        + (" " + QUOTE_PROMPT if verify_quotes is not None else ""),
+        cache=cache,
+        layout=layout,
+        n=best_of_n,
+        config=config,
     )
 
+    early_stop = early_stop_threshold is not None
     judge = judge_agent(
-        agent_prompt=CONSULTANT_JUDGE_PROMPT,
+        agent_prompt=CONSULTANT_JUDGE_PROMPT
+        + (" " + JUDGE_QUOTE_PROMPT if verify_quotes is not None else "")
+        + (" " + JUDGE_CONFIDENCE_PROMPT if early_stop else ""),
         ignore_msg_with_tags=[] if symmetric else ["<article>"],
+        cache=cache,
+        layout=layout,
+        config=config.merge(CONFIDENCE_CONFIG) if early_stop else config,
+        verify_quotes=verify_quotes,
+        compaction=compaction,
     )
 
     async def execute(state: AgentState) -> AgentState:
+        steps = checkpoints.steps(state) if checkpoints else ProtocolSteps()
+        turns_run = 0
         for turn in range(num_turns):
-            state = await run(consultant, state)
-            state = await run(judge, state)
+            with turn_span("consultancy", turn):
+                state = await steps.run(partial(run, consultant), state)
+                state = await steps.run(partial(run, judge), state)
+            turns_run += 1
+            if early_stop_threshold is not None and judge_is_confident(
+                state, early_stop_threshold, turn
+            ):
+                break
+        if early_stop:
+            record_turns(num_turns, turns_run)
         return state
 
     return execute
@@ -45,17 +142,183 @@ def debate(
     judge: Agent,
     num_turns: int,
     interactive: bool = False,
+    simultaneous: bool = False,
+    early_stop_threshold: float | None = None,
+    checkpoints: CheckpointStore | None = None,
 ) -> Agent:
+    """
+
+    Args:
+    interactive: bool - When True judge interacts with debaters after every round.
+    simultaneous: bool - When True debaters of a round argue concurrently and see only
+                previous rounds. When False, debaters argue one after another.
+    early_stop_threshold: float | None - Interactive debate only. Stop once the
+                judge's probability of its answer reaches the threshold, the judge
+                should be set up with `CONFIDENCE_CONFIG` or asked for confidence.
+    checkpoints: CheckpointStore | None - Save state after every debater and judge
+                turn (every round when simultaneous), a rerun continues from the
+                last saved turn.
+    """
+    early_stop = early_stop_threshold is not None
+    if early_stop and not interactive:
+        raise ValueError("Early stopping needs interactive debate")
+
     async def execute(state: AgentState) -> AgentState:
+        steps = checkpoints.steps(state) if checkpoints else ProtocolSteps()
+        turns_run = 0
         for turn in range(num_turns):
-            for debater in debaters:
-                state = await run(debater, state)
-            if interactive:
-                state = await run(judge, state)
+            with turn_span("debate", turn):
+                if simultaneous:
+                    state = await steps.run(
+                        partial(simultaneous_round, debaters), state
+                    )
+                else:
+                    for debater in debaters:
+                        state = await steps.run(partial(run, debater), state)
+                if interactive:
+                    state = await steps.run(partial(run, judge), state)
+            turns_run += 1
+            # early stopping is only allowed for interactive debate
+            if early_stop_threshold is not None and judge_is_confident(
+                state, early_stop_threshold, turn
+            ):
+                break
+        if early_stop:
+            record_turns(num_turns, turns_run)
 
         if not interactive:
-            state = await run(judge, state)
+            with turn_span("debate", num_turns):
+                state = await steps.run(partial(run, judge), state)
+
+        return state
+
+    return execute
+
+
+async def simultaneous_round(debaters: list[Agent], state: AgentState) -> AgentState:
+    """Run all debaters on the same snapshot of state and merge their new messages in
+    the order of debaters."""
+    num_messages = len(state.messages)
+    results = await collect(*(run(debater, state) for debater in debaters))
+    for result in results:
+        state.messages.extend(result.messages[num_messages:])
+    state.output = results[-1].output
+    return state
+
+
+@dataclass(frozen=True)
+class SweepConfig:
+    num_turns: int
+    interactive: bool
+    judge: str
+
+    @property
+    def name(self) -> str:
+        return (
+            f"num_turns={self.num_turns},interactive={self.interactive},"
+            f"judge={self.judge}"
+        )
+
+    def steps(self) -> list[tuple[str, ...]]:
+        """Protocol steps of the config, a debaters' round or a judge turn."""
+        steps: list[tuple[str, ...]] = []
+        for _ in range(self.num_turns):
+            steps.append(("debaters",))
+            if self.interactive:
+                steps.append(("judge", self.judge))
+        if not self.interactive:
+            steps.append(("judge", self.judge))
+        return steps
+
+
+@dataclass
+class SweepNode:
+    step: tuple[str, ...] | None = None
+    children: dict[tuple[str, ...], "SweepNode"] = field(default_factory=dict)
+    configs: list[SweepConfig] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return (self.step is not None) + sum(map(len, self.children.values()))
+
+
+def sweep_tree(configs: list[SweepConfig]) -> SweepNode:
+    """Prefix tree of the configs' steps, configs end at the node of their last
+    step."""
+    root = SweepNode()
+    for config in configs:
+        node = root
+        for step in config.steps():
+            node = node.children.setdefault(step, SweepNode(step))
+        node.configs.append(config)
+    return root
+
+
+@agent
+def debate_sweep(
+    debaters: list[Agent],
+    judges: dict[str, Agent],
+    configs: list[SweepConfig],
+    simultaneous: bool = False,
+) -> Agent:
+    """Debates of several configs (turns, interactive, judge) run as one prefix tree.
+
+    Steps shared by configs are generated once and the state is forked where the
+    configs differ, branches run concurrently. E.g. non-interactive debates with
+    1 to 4 turns cost about as much as the one with 4 turns. Final judge replies go
+    into the sample store (`DebateSweep`) and the sample ends with the longest
+    transcript.
+
+    Args:
+    judges: dict[str, Agent] - Judges by name, `SweepConfig.judge` is one of them.
+    simultaneous: bool - When True debaters of a round argue concurrently and see only
+                previous rounds. When False, debaters argue one after another.
+    """
+    tree = sweep_tree(configs)
+    num_steps = len(tree)
+    num_separate_steps = sum(len(config.steps()) for config in configs)
+
+    async def debaters_round(state: AgentState) -> AgentState:
+        if simultaneous:
+            return await simultaneous_round(debaters, state)
+        for debater in debaters:
+            state = await run(debater, state)
+        return state
+
+    async def execute(state: AgentState) -> AgentState:
+        answers: dict[str, str] = {}
+        transcripts: list[AgentState] = []
+
+        async def run_node(node: SweepNode, state: AgentState) -> None:
+            if node.step == ("debaters",):
+                state = await debaters_round(state)
+            elif node.step is not None:
+                state = await run(judges[node.step[1]], state)
+            for config in node.configs:
+                answers[config.name] = state.output.completion
+            if not node.children:
+                transcripts.append(state)
+            children = list(node.children.values())
+            if len(children) == 1:
+                await run_node(children[0], state)
+            else:
+                await collect(
+                    *(
+                        run_node(
+                            child,
+                            AgentState(messages=list(state.messages)),
+                        )
+                        for child in children
+                    )
+                )
 
+        await run_node(tree, state)
+        sweep = store_as(DebateSweep)
+        sweep.answers = answers
+        sweep.steps_run = num_steps
+        sweep.steps_separate = num_separate_steps
+        longest = max(transcripts, key=lambda t: len(t.messages))
+        state.messages = longest.messages
+        state.output = longest.output
         return state
 
     return execute
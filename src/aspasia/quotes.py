@@ -0,0 +1,152 @@
+import re
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+
+from inspect_ai.model import ChatMessage
+
+from aspasia.datasets.article_store import article_store
+
+MAX_CACHED_INDEXES = 256
+
+QUOTE_PATTERN = re.compile(r"<quote>(.*?)</quote>", re.DOTALL)
+WORD_PATTERN = re.compile(r"\w+")
+
+_indexes: OrderedDict[str, "QuoteIndex"] = OrderedDict()
+
+
+def words(text: str) -> list[str]:
+    """Lowercase words of text, so quotes match regardless of case, punctuation and
+    whitespace."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+class SuffixAutomaton:
+    """Suffix automaton of a sequence of symbols.
+
+    Built in time linear in the sequence, finds the longest run of a query that
+    occurs in the sequence in time linear in the query.
+    """
+
+    def __init__(self, sequence: Sequence[int]) -> None:
+        self.next: list[dict[int, int]] = [{}]
+        self.link = [-1]
+        self.length = [0]
+        last = 0
+        for symbol in sequence:
+            last = self._extend(last, symbol)
+
+    def _extend(self, last: int, symbol: int) -> int:
+        next, link, length = self.next, self.link, self.length
+        current = len(length)
+        next.append({})
+        link.append(0)
+        length.append(length[last] + 1)
+        state = last
+        while state != -1 and symbol not in next[state]:
+            next[state][symbol] = current
+            state = link[state]
+        if state == -1:
+            return current
+        target = next[state][symbol]
+        if length[state] + 1 == length[target]:
+            link[current] = target
+            return current
+        clone = len(length)
+        next.append(dict(next[target]))
+        link.append(link[target])
+        length.append(length[state] + 1)
+        while state != -1 and next[state].get(symbol) == target:
+            next[state][symbol] = clone
+            state = link[state]
+        link[target] = clone
+        link[current] = clone
+        return current
+
+    def longest_match(self, query: Sequence[int]) -> int:
+        """Length of the longest run of query that occurs in the sequence."""
+        next, link, length = self.next, self.link, self.length
+        state = matched = longest = 0
+        for symbol in query:
+            while state and symbol not in next[state]:
+                state = link[state]
+                matched = length[state]
+            if symbol in next[state]:
+                state = next[state][symbol]
+                matched += 1
+                longest = max(longest, matched)
+        return longest
+
+
+class QuoteIndex:
+    """Word index of an article that checks quotes against it."""
+
+    def __init__(self, article: str) -> None:
+        self.vocabulary: dict[str, int] = {}
+        self.automaton = SuffixAutomaton(
+            [
+                self.vocabulary.setdefault(word, len(self.vocabulary))
+                for word in words(article)
+            ]
+        )
+
+    def match_ratio(self, quote: str) -> float:
+        """Fraction of the quote's words in the longest run found in the article,
+        1.0 for an exact quote."""
+        quote_words = words(quote)
+        if not quote_words:
+            return 0.0
+        longest = self.automaton.longest_match(
+            [self.vocabulary.get(word, -1) for word in quote_words]
+        )
+        return longest / len(quote_words)
+
+    def verify(self, text: str, min_ratio: float = 1.0) -> str:
+        """Mark quotes of text as verified (`<v_quote>`) when their match ratio is at
+        least min_ratio and as unverified (`<u_quote>`) otherwise."""
+
+        def mark(match: re.Match[str]) -> str:
+            quote = match.group(1)
+            tag = "v_quote" if self.match_ratio(quote) >= min_ratio else "u_quote"
+            return f"<{tag}>{quote}</{tag}>"
+
+        return QUOTE_PATTERN.sub(mark, text)
+
+
+def quote_index(article_id: str) -> QuoteIndex:
+    """Index of an article from the article store, built once per article."""
+    index = _indexes.get(article_id)
+    if index is None:
+        index = QuoteIndex(article_store.get(article_id))
+        _indexes[article_id] = index
+        if len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(article_id)
+    return index
+
+
+def sample_article_id(messages: list[ChatMessage]) -> str | None:
+    for message in messages:
+        if message.metadata and "article_id" in message.metadata:
+            return message.metadata["article_id"]
+    return None
+
+
+def quote_verifier(
+    messages: list[ChatMessage], min_ratio: float = 1.0
+) -> Callable[[ChatMessage], ChatMessage] | None:
+    """Message transform marking quotes against the article of the sample with
+    messages, None when the sample has no article."""
+    article_id = sample_article_id(messages)
+    if article_id is None:
+        return None
+
+    def verify(message: ChatMessage) -> ChatMessage:
+        if not isinstance(message.content, str) or "<quote>" not in message.content:
+            return message
+        index = quote_index(article_id)
+        return message.model_copy(
+            update={"content": index.verify(message.content, min_ratio)}
+        )
+
+    return verify
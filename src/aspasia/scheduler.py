@@ -0,0 +1,258 @@
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+import anyio
+from inspect_ai.log import ModelEvent, transcript
+from inspect_ai.model import ChatMessage, GenerateConfig, Model, ModelOutput
+from inspect_ai.util import StoreModel, store_as
+from pydantic import Field
+
+from aspasia.cache import GenerateFn
+
+# rate limit scale after backoff never goes below this share of the budget
+MIN_RATE_SCALE = 1 / 64
+# rate limit scale regained after every request without retries
+RATE_SCALE_INCREASE = 0.05
+# cooldown after a retried request, doubled for consecutive ones
+BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+# waiters recheck the queue at least this often
+MAX_POLL_SECONDS = 1.0
+# buckets hold this many seconds of budget, so requests are spread over the minute
+BURST_SECONDS = 1.0
+
+# scheduler of the running sample's task, set by the `use_scheduler` solver
+_scheduler: ContextVar["Scheduler"] = ContextVar("scheduler")
+
+
+@dataclass
+class RateLimit:
+    """Budget of a role or model, None for no limit."""
+
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+
+
+class SchedulerStats(StoreModel):
+    """Queue depth and wait of every scheduled generation, saved in the sample
+    store."""
+
+    requests: list[dict[str, Any]] = Field(default_factory=list)
+
+
+class TokenBucket:
+    """Refills at rate per minute (times the queue's rate scale), holds at most
+    `BURST_SECONDS` of it."""
+
+    def __init__(self, rate_per_minute: float) -> None:
+        self.rate = rate_per_minute / 60
+        self.capacity = max(self.rate * BURST_SECONDS, 1.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float, scale: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate * scale
+        )
+        self._updated = now
+
+    def wait_time(self, amount: float, scale: float) -> float:
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing, 0.0) / (self.rate * scale)
+
+
+class RoleQueue:
+    """Token buckets and priority queue of one role or model.
+
+    Requests wait in priority order until both buckets have room. A request that
+    needed retries (the provider was rate limited or overloaded) or failed halves
+    the rate of the buckets and pauses the queue, once for all requests admitted
+    before the backoff; every request without retries raises it back a little
+    (AIMD).
+    """
+
+    def __init__(self, name: str, limit: RateLimit) -> None:
+        self.name = name
+        self.requests = (
+            TokenBucket(limit.requests_per_minute)
+            if limit.requests_per_minute
+            else None
+        )
+        self.tokens = (
+            TokenBucket(limit.tokens_per_minute) if limit.tokens_per_minute else None
+        )
+        self.scale = 1.0
+        self.cooldown_until = 0.0
+        self.num_backoffs = 0
+        self.last_backoff = 0.0
+        self._waiting: list[tuple[int, int]] = []
+        self._counter = itertools.count()
+        self._changed = anyio.Event()
+
+    def wait_time(self, tokens: float, requests: int) -> float:
+        now = time.monotonic()
+        wait = max(self.cooldown_until - now, 0.0)
+        for bucket, amount in ((self.requests, requests), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now, self.scale)
+                wait = max(wait, bucket.wait_time(amount, self.scale))
+        return wait
+
+    async def acquire(
+        self, tokens: float, requests: int, priority: int
+    ) -> tuple[int, float]:
+        """Wait for the budget, returns the queue depth at arrival and the time of
+        admission."""
+        ticket = (-priority, next(self._counter))
+        heapq.heappush(self._waiting, ticket)
+        depth = len(self._waiting)
+        try:
+            while True:
+                wait = MAX_POLL_SECONDS
+                if self._waiting[0] == ticket:
+                    wait = min(self.wait_time(tokens, requests), MAX_POLL_SECONDS)
+                    if wait == 0:
+                        heapq.heappop(self._waiting)
+                        for bucket, amount in (
+                            (self.requests, requests),
+                            (self.tokens, tokens),
+                        ):
+                            if bucket is not None:
+                                bucket.tokens -= amount
+                        self._notify()
+                        return depth, time.monotonic()
+                changed = self._changed
+                with anyio.move_on_after(wait):
+                    await changed.wait()
+        except BaseException:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._notify()
+            raise
+
+    def release(
+        self,
+        estimated_tokens: float,
+        used_tokens: float,
+        retries: int,
+        admitted: float,
+    ) -> None:
+        if self.tokens is not None:
+            self.tokens.tokens -= used_tokens - estimated_tokens
+        if retries:
+            if admitted > self.last_backoff:
+                self.last_backoff = time.monotonic()
+                self.scale = max(self.scale / 2, MIN_RATE_SCALE)
+                self.cooldown_until = self.last_backoff + min(
+                    BACKOFF_SECONDS * 2**self.num_backoffs, MAX_BACKOFF_SECONDS
+                )
+                self.num_backoffs += 1
+        else:
+            self.scale = min(self.scale + RATE_SCALE_INCREASE, 1.0)
+            self.num_backoffs = 0
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = anyio.Event()
+
+
+class Scheduler:
+    """Per-role (or per-model) rate limits of agent generations.
+
+    Disabled without limits, then agents only check `enabled`. Roles and models
+    without a limit aren't scheduled.
+
+    Every task has its own scheduler, agents use the one of the running sample's
+    task, see `current_scheduler`.
+    """
+
+    def __init__(self, limits: dict[str, RateLimit] | None = None) -> None:
+        self.limits = limits or {}
+        self.enabled = bool(self.limits)
+        self._queues: dict[str, RoleQueue] = {}
+
+    def queue(self, role: str, model: Model) -> RoleQueue | None:
+        for name in (role, str(model)):
+            if name in self.limits:
+                if name not in self._queues:
+                    self._queues[name] = RoleQueue(name, self.limits[name])
+                return self._queues[name]
+        return None
+
+    async def generate(
+        self,
+        role: str,
+        model: Model,
+        messages: list[ChatMessage],
+        config: GenerateConfig,
+        generate: GenerateFn,
+        requests: int = 1,
+    ) -> tuple[list[ChatMessage], ModelOutput]:
+        """Run generate within the role's budget.
+
+        Samples further into their protocol (longer history) go first, to cut the
+        time until the last samples finish.
+        """
+        queue = self.queue(role, model)
+        if queue is None:
+            return await generate()
+        estimated_tokens = requests * (
+            sum(len(message.text) for message in messages) / 4
+            + (config.max_tokens or 0)
+        )
+        start = time.perf_counter()
+        depth, admitted = await queue.acquire(estimated_tokens, requests, len(messages))
+        wait = time.perf_counter() - start
+        events = transcript().events
+        num_events = len(events)
+        try:
+            new_messages, output = await generate()
+        except Exception:
+            # retries ran out or the request can't succeed: back off and give back
+            # the tokens, the provider didn't use them
+            queue.release(estimated_tokens, 0, 1, admitted)
+            raise
+        # attempts that failed and were retried by Inspect stay pending
+        retries = sum(
+            (event.retries or 0) + bool(event.pending)
+            for event in events[num_events:]
+            if isinstance(event, ModelEvent)
+        )
+        usage = output.usage
+        queue.release(
+            estimated_tokens,
+            usage.total_tokens if usage else estimated_tokens,
+            retries,
+            admitted,
+        )
+        stats = store_as(SchedulerStats)
+        stats.requests = [
+            *stats.requests,
+            {
+                "role": role,
+                "queue": queue.name,
+                "queue_depth": depth,
+                "wait": wait,
+                "retries": retries,
+                "rate_scale": queue.scale,
+            },
+        ]
+        return new_messages, output
+
+
+_unlimited = Scheduler()
+
+
+def current_scheduler() -> Scheduler:
+    """Scheduler of the running sample's task, disabled outside tasks that set one."""
+    return _scheduler.get(_unlimited)
+
+
+def set_scheduler(scheduler: Scheduler) -> None:
+    _scheduler.set(scheduler)
@@ -0,0 +1,199 @@
+from collections.abc import Sequence
+
+from inspect_ai.model import ChatMessageUser, GenerateConfig, ModelOutput, get_model
+from inspect_ai.scorer import (
+    CORRECT,
+    INCORRECT,
+    Metric,
+    SampleScore,
+    Score,
+    Scorer,
+    Target,
+    accuracy,
+    metric,
+    scorer,
+    stderr,
+)
+from inspect_ai.solver import TaskState
+
+from aspasia.agents import judge_transform
+from aspasia.compaction import Compaction, CompactionMode
+from aspasia.confidence import ANSWER_PATTERN, token_answer_probabilities
+from aspasia.prompts import FINAL_JUDGE_PROMPT, FINAL_JUDGE_TEMPLATE
+from aspasia.protocols import DebateSweep
+from aspasia.utils import prepare_messages
+
+# one answer token, with enough alternatives to find every letter
+FINAL_JUDGE_CONFIG = GenerateConfig(
+    temperature=0.0, max_tokens=1, logprobs=True, top_logprobs=20
+)
+
+
+def final_answer_probabilities(
+    output: ModelOutput, letters: Sequence[str]
+) -> tuple[dict[str, float], str]:
+    """Probabilities of answer letters from a one token judge reply and where they
+    come from: "logprobs", "completion" (1.0 for the letter replied, when the
+    provider has no logprobs) or "uniform" (no letter in the reply)."""
+    if output.choices:
+        logprobs = output.choices[0].logprobs
+        if logprobs is not None and logprobs.content:
+            probabilities = token_answer_probabilities(logprobs.content[0], letters)
+            if probabilities is not None:
+                return probabilities, "logprobs"
+    answer = output.completion.strip().strip("(")[:1].upper()
+    if answer in letters:
+        return {letter: float(letter == answer) for letter in letters}, "completion"
+    return dict.fromkeys(letters, 1 / len(letters)), "uniform"
+
+
+def answered(scores: list[SampleScore]) -> list[Score]:
+    """`judge_logprobs` scores of replies with an answer letter."""
+    return [
+        item.score
+        for item in scores
+        if item.score.metadata and item.score.metadata["source"] != "uniform"
+    ]
+
+
+@metric
+def brier_score() -> Metric:
+    """Mean of (1 - P(target))², P from `judge_logprobs` score metadata. Replies
+    without an answer letter are left out, see `no_answer_rate`."""
+
+    def metric(scores: list[SampleScore]) -> float:
+        errors = [
+            (1 - score.metadata["probabilities"][score.metadata["target"]]) ** 2
+            for score in answered(scores)
+        ]
+        return sum(errors) / len(errors) if errors else float("nan")
+
+    return metric
+
+
+@metric
+def expected_calibration_error(num_bins: int = 10) -> Metric:
+    """Expected calibration error of the chosen answers' probabilities, from
+    `judge_logprobs` score metadata. Replies without an answer letter are left out,
+    see `no_answer_rate`."""
+
+    def metric(scores: list[SampleScore]) -> float:
+        bins: list[list[tuple[float, float]]] = [[] for _ in range(num_bins)]
+        for score in answered(scores):
+            confidence = max(score.metadata["probabilities"].values())
+            correct = float(score.answer == score.metadata["target"])
+            bins[min(int(confidence * num_bins), num_bins - 1)].append(
+                (confidence, correct)
+            )
+        total = sum(len(b) for b in bins)
+        if total == 0:
+            return float("nan")
+        return (
+            sum(abs(sum(c for c, _ in b) - sum(a for _, a in b)) for b in bins if b)
+            / total
+        )
+
+    return metric
+
+
+@metric
+def no_answer_rate() -> Metric:
+    """Share of `judge_logprobs` replies without an answer letter, scored incorrect."""
+
+    def metric(scores: list[SampleScore]) -> float:
+        judged = [item.score for item in scores if item.score.metadata]
+        if not judged:
+            return float("nan")
+        return 1 - len(answered(scores)) / len(judged)
+
+    return metric
+
+
+@scorer(
+    metrics=[
+        accuracy(),
+        stderr(),
+        brier_score(),
+        expected_calibration_error(),
+        no_answer_rate(),
+    ]
+)
+def judge_logprobs(
+    ignore_msg_with_tags: list[str] = ["<article>"],
+    judge_role: str = "judge",
+    judge_compaction: CompactionMode | None = None,
+    judge_token_budget: int = 4000,
+    judge_keep_messages: int = 2,
+) -> Scorer:
+    """Final decision of the judge model, read from one answer token.
+
+    The judge sees the finished transcript like the protocol's judge (private parts
+    removed, messages starting with ignore_msg_with_tags hidden and, with
+    judge_compaction, older turns shortened, see `Compaction`) and replies with the
+    letter of an answer. The letters' probabilities are recorded in the score
+    metadata. A reply without a letter has no answer and is scored incorrect. Also
+    works for re-scoring logs with `inspect score`.
+    """
+
+    compaction = (
+        None
+        if judge_compaction is None
+        else Compaction(judge_compaction, judge_token_budget, judge_keep_messages)
+    )
+
+    async def score(state: TaskState, target: Target) -> Score:
+        letters = state.metadata.get("letters", ["A", "B"])
+        messages = prepare_messages(
+            state.messages,
+            ignore_msg_with_tags,
+            agent_prompt=FINAL_JUDGE_PROMPT,
+            transform=judge_transform(state.messages),
+        )
+        model = get_model(role=judge_role)
+        if compaction is not None:
+            messages = await compaction.compact(messages, model, record=False)
+        messages.append(
+            ChatMessageUser(
+                content=FINAL_JUDGE_TEMPLATE.format(letters=", ".join(letters))
+            )
+        )
+        output = await model.generate(messages, config=FINAL_JUDGE_CONFIG)
+        probabilities, source = final_answer_probabilities(output, letters)
+        answer = (
+            None
+            if source == "uniform"
+            else max(letters, key=lambda letter: probabilities[letter])
+        )
+        return Score(
+            value=CORRECT if answer == target.text else INCORRECT,
+            answer=answer,
+            explanation=output.completion,
+            metadata={
+                "probabilities": probabilities,
+                "source": source,
+                "target": target.text,
+            },
+        )
+
+    return score
+
+
+@scorer(metrics={"*": [accuracy(), stderr()]})
+def sweep_answers() -> Scorer:
+    """Correctness of the final judge answer ('ANSWER: X') of every config of a
+    `debate_sweep`, one score value per config."""
+
+    async def score(state: TaskState, target: Target) -> Score:
+        answers = {}
+        for name, completion in state.store_as(DebateSweep).answers.items():
+            letters = ANSWER_PATTERN.findall(completion)
+            answers[name] = letters[-1] if letters else ""
+        return Score(
+            value={
+                name: CORRECT if answer == target.text else INCORRECT
+                for name, answer in answers.items()
+            },
+            answer=", ".join(f"{name}: {answer}" for name, answer in answers.items()),
+        )
+
+    return score
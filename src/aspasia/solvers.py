@@ -3,6 +3,7 @@ from random import Random
 from typing import Unpack
 
 from inspect_ai._util.logger import warn_once
+from inspect_ai.model import ChatMessageUser
 from inspect_ai.solver import Generate, Solver, TaskState, solver
 from inspect_ai.solver._multiple_choice import (
     MULTIPLE_ANSWER_TEMPLATE,
@@ -15,6 +16,10 @@ from inspect_ai.solver._multiple_choice import (
 )
 from inspect_ai.util import resource
 
+from aspasia.datasets.article_store import article_reference
+from aspasia.scheduler import Scheduler, set_scheduler
+from aspasia.telemetry import Telemetry, set_telemetry
+
 logger = logging.getLogger(__name__)
 
 
@@ -79,3 +84,52 @@ def multiple_choice_no_generation(
         return state
 
     return solve
+
+
+@solver
+def article_message(template: str) -> Solver:
+    """Append the sample's article as a user message formatted with template.
+
+    The message holds only a reference to the article, the text is resolved from the
+    article store when agents build model inputs.
+    """
+
+    async def solve(state: TaskState, generate: Generate) -> TaskState:
+        article_id = state.metadata["article_id"]
+        state.messages.append(
+            ChatMessageUser(
+                content=template.format(article=article_reference(article_id)),
+                metadata={"article_id": article_id},
+            )
+        )
+        return state
+
+    return solve
+
+
+@solver
+def use_telemetry(telemetry: Telemetry) -> Solver:
+    """Record spans of the sample's agents and protocol turns with telemetry.
+
+    Task setup step, so every task (and eval) keeps its own exporters and totals.
+    """
+
+    async def solve(state: TaskState, generate: Generate) -> TaskState:
+        set_telemetry(telemetry)
+        return state
+
+    return solve
+
+
+@solver
+def use_scheduler(scheduler: Scheduler) -> Solver:
+    """Schedule the sample's agent generations with scheduler.
+
+    Task setup step, so every task (and eval) keeps its own rate limits and queues.
+    """
+
+    async def solve(state: TaskState, generate: Generate) -> TaskState:
+        set_scheduler(scheduler)
+        return state
+
+    return solve
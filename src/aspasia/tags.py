@@ -0,0 +1,95 @@
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from inspect_ai.model import ChatMessage, ChatMessageAssistant
+
+MAX_CACHED_MESSAGES = 100_000
+
+PRIVATE_TAGS = ("thinking",)
+# parts of a message the judge sees, quotes also as marked by quote verification
+PUBLIC_TAGS = ("argument", "quote", "v_quote", "u_quote")
+TAG_PATTERN = re.compile(r"<(/?)([A-Za-z_]+)>")
+
+# message id -> parsed content
+_parsed_messages: OrderedDict[str, "ParsedText"] = OrderedDict()
+
+
+@dataclass(frozen=True)
+class ParsedText:
+    public: str
+    """`<argument>` parts and quotes outside them with their tags, one per line, or
+    the text outside private tags when it has neither."""
+    private: str
+    """Contents of private tags, one per line."""
+
+
+def parse_tags(
+    text: str,
+    private_tags: tuple[str, ...] = PRIVATE_TAGS,
+    public_tags: tuple[str, ...] = PUBLIC_TAGS,
+) -> ParsedText:
+    """Split text into public and private parts in a single pass.
+
+    Agents are told the judge only sees their `<argument>`, so when text has public
+    tags everything else (e.g. a stray answer) is left out. Tags don't nest, an
+    unclosed tag (e.g. in a truncated generation) runs to the end of the text.
+    """
+    public: list[str] = []
+    private: list[str] = []
+    outside: list[str] = []
+    position = 0
+    start = 0
+    open_tag: str | None = None
+    for match in TAG_PATTERN.finditer(text):
+        closing, name = match.groups()
+        if open_tag is None and not closing and name in private_tags:
+            outside.append(text[position : match.start()])
+            start = match.end()
+            open_tag = name
+        elif open_tag is None and not closing and name in public_tags:
+            start = match.start()
+            open_tag = name
+        elif closing and name == open_tag:
+            if open_tag in private_tags:
+                private.append(text[start : match.start()])
+                position = match.end()
+            else:
+                public.append(text[start : match.end()].strip())
+            open_tag = None
+    if open_tag in private_tags:
+        private.append(text[start:])
+    else:
+        outside.append(text[position:])
+        if open_tag is not None:
+            public.append(text[start:].strip())
+    return ParsedText(
+        "\n".join(public) if public else "".join(outside).strip(),
+        "\n".join(private).strip(),
+    )
+
+
+def parsed_text(message: ChatMessage) -> ParsedText:
+    """Parsed text of message, parsed once per message id."""
+    if message.id is None:
+        return parse_tags(message.text)
+    parsed = _parsed_messages.get(message.id)
+    if parsed is None:
+        parsed = parse_tags(message.text)
+        _parsed_messages[message.id] = parsed
+        if len(_parsed_messages) > MAX_CACHED_MESSAGES:
+            _parsed_messages.popitem(last=False)
+    return parsed
+
+
+def public_message(message: ChatMessage) -> ChatMessage:
+    """Copy of an assistant message without private parts, other messages and ones
+    without private parts are returned as is."""
+    if not isinstance(message, ChatMessageAssistant) or not isinstance(
+        message.content, str
+    ):
+        return message
+    parsed = parsed_text(message)
+    if parsed.public == message.content.strip():
+        return message
+    return message.model_copy(update={"content": parsed.public})
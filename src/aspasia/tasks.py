@@ -2,23 +2,48 @@ from pathlib import Path
 from typing import Literal
 
 from inspect_ai import Task, task
-from inspect_ai.model import GenerateConfig
+from inspect_ai.model import BatchConfig, GenerateConfig
 from inspect_ai.scorer import answer
-from inspect_ai.solver import user_message
 
-from aspasia.agents import debater_agent, human_judge_agent, judge_agent
+from aspasia.agents import (
+    MessageLayout,
+    debater_agent,
+    human_judge_agent,
+    judge_agent,
+    web_judge_agent,
+)
+from aspasia.cache import GenerationCache
+from aspasia.checkpoints import CheckpointStore
+from aspasia.compaction import Compaction, CompactionMode
+from aspasia.confidence import CONFIDENCE_CONFIG
 from aspasia.datasets import QuALITY
+from aspasia.datasets.transcripts import transcript_dataset
+from aspasia.judge_server import JudgeServer
 from aspasia.prompts import (
     ARTICLE_TEMPLATE,
+    CONSULTANT_JUDGE_PROMPT,
     DEBATER_JUDGE_PROMPT,
     DEBATER_PROMPT,
+    JUDGE_CONFIDENCE_PROMPT,
+    JUDGE_QUOTE_PROMPT,
     MCQ_TEMPLATE,
+    QUOTE_PROMPT,
 )
 from aspasia.protocols import (
+    SweepConfig,
     consultancy,
     debate,
+    debate_sweep,
+)
+from aspasia.scheduler import RateLimit, Scheduler
+from aspasia.scorers import judge_logprobs, sweep_answers
+from aspasia.solvers import (
+    article_message,
+    multiple_choice_no_generation,
+    use_scheduler,
+    use_telemetry,
 )
-from aspasia.solvers import multiple_choice_no_generation
+from aspasia.telemetry import Telemetry
 
 
 @task
@@ -30,31 +55,86 @@ def consultancy_runner(
     judge_model: str = "openai/gpt-4.1-nano",
     consultant_side: Literal["random", "target"] = "target",
     random_seed: int = 25,
+    shard: int = 0,
+    num_shards: int = 1,
+    cache_dir: str | None = None,
+    cache_max_size_mb: int = 1024,
+    cache_replay: bool = False,
+    message_layout: MessageLayout = "inline",
+    best_of_n: int = 1,
+    batch_size: int = 0,
+    batch_delay: float = 15.0,
+    early_stop_threshold: float | None = None,
+    instrument: bool = False,
+    instrument_jsonl: str | None = None,
+    instrument_prometheus: str | None = None,
+    checkpoint_dir: str | None = None,
+    verify_quotes: float | None = None,
+    rate_limits: dict[str, dict[str, float]] | None = None,
+    judge_compaction: CompactionMode | None = None,
+    judge_token_budget: int = 4000,
+    judge_keep_messages: int = 2,
 ):
     dataset = QuALITY(
         Path(dataset_path),
         random_seed=random_seed,
-    ).get_memory_dataset("dev")
+    ).get_memory_dataset("dev", shard=dataset_shard(shard, num_shards))
+    telemetry = task_telemetry(instrument, instrument_jsonl, instrument_prometheus)
+    scheduler = task_scheduler(rate_limits)
+    cache = generation_cache(cache_dir, cache_max_size_mb, cache_replay)
+    batch = batch_config(batch_size, batch_delay)
     consultancy_solver = consultancy(
         num_turns=num_turns,
         interactive=interactive,
         consultant_side=consultant_side,
+        cache=cache,
+        layout=message_layout,
+        best_of_n=best_of_n,
+        config=GenerateConfig(batch=batch),
+        early_stop_threshold=early_stop_threshold,
+        verify_quotes=verify_quotes,
+        compaction=compaction(
+            judge_compaction, judge_token_budget, judge_keep_messages
+        ),
+        checkpoints=checkpoint_store(
+            checkpoint_dir,
+            {
+                "protocol": "consultancy",
+                "dataset_path": dataset_path,
+                "num_turns": num_turns,
+                "interactive": interactive,
+                "consultant_model": consultant_model,
+                "judge_model": judge_model,
+                "consultant_side": consultant_side,
+                "random_seed": random_seed,
+                "message_layout": message_layout,
+                "best_of_n": best_of_n,
+                "early_stop_threshold": early_stop_threshold,
+                "verify_quotes": verify_quotes,
+                "judge_compaction": judge_compaction,
+                "judge_token_budget": judge_token_budget,
+                "judge_keep_messages": judge_keep_messages,
+            },
+        ),
     )
     return Task(
         dataset=dataset,
+        setup=[use_telemetry(telemetry), use_scheduler(scheduler)],
         solver=[
             multiple_choice_no_generation(template=MCQ_TEMPLATE),
-            user_message(ARTICLE_TEMPLATE),
-            consultancy_solver, # type: ignore
+            article_message(ARTICLE_TEMPLATE),
+            consultancy_solver,  # type: ignore
         ],
         message_limit=12,
         model_roles={"consultant": consultant_model, "judge": judge_model},
         # TODO: Add generation for both models
-        config=GenerateConfig(temperature=0.0, max_tokens=300),
+        config=GenerateConfig(temperature=0.0, max_tokens=300, batch=batch),
         name="consultancy_test",
-        # TODO: Add custom scorer: judge model will evaluate letter based on
-        # given conversation
-        scorer=answer(pattern="letter"),
+        scorer=judge_logprobs(
+            judge_compaction=judge_compaction,
+            judge_token_budget=judge_token_budget,
+            judge_keep_messages=judge_keep_messages,
+        ),
     )
 
 
@@ -64,24 +144,86 @@ def debate_runner(
     num_turns: int = 2,
     num_debaters: int = 2,
     interactive: bool = False,
+    simultaneous: bool = False,
     debater_model: str = "openai/gpt-4.1-nano",
     judge_model: str = "openai/gpt-4.1-nano",
-    judge_type: Literal["agent", "human"] = "agent",
+    judge_type: Literal["agent", "human", "web"] = "agent",
     random_seed: int = 25,
+    shard: int = 0,
+    num_shards: int = 1,
+    cache_dir: str | None = None,
+    cache_max_size_mb: int = 1024,
+    cache_replay: bool = False,
+    message_layout: MessageLayout = "inline",
+    best_of_n: int = 1,
+    batch_size: int = 0,
+    batch_delay: float = 15.0,
+    early_stop_threshold: float | None = None,
+    instrument: bool = False,
+    instrument_jsonl: str | None = None,
+    instrument_prometheus: str | None = None,
+    judge_server_port: int = 8000,
+    judge_lease_timeout: float = 600.0,
+    checkpoint_dir: str | None = None,
+    verify_quotes: float | None = None,
+    rate_limits: dict[str, dict[str, float]] | None = None,
+    judge_compaction: CompactionMode | None = None,
+    judge_token_budget: int = 4000,
+    judge_keep_messages: int = 2,
 ):
     dataset = QuALITY(
         Path(dataset_path),
         random_seed=random_seed,
-    ).get_memory_dataset("dev")
-    
-    debaters = [debater_agent(agent_prompt=DEBATER_PROMPT) for _ in range(num_debaters)]
+    ).get_memory_dataset("dev", shard=dataset_shard(shard, num_shards))
+
+    telemetry = task_telemetry(instrument, instrument_jsonl, instrument_prometheus)
+    scheduler = task_scheduler(rate_limits)
+    cache = generation_cache(cache_dir, cache_max_size_mb, cache_replay)
+    batch = batch_config(batch_size, batch_delay)
+    debaters = [
+        debater_agent(
+            agent_prompt=DEBATER_PROMPT
+            + (" " + QUOTE_PROMPT if verify_quotes is not None else ""),
+            cache=cache,
+            layout=message_layout,
+            n=best_of_n,
+            config=GenerateConfig(batch=batch),
+        )
+        for _ in range(num_debaters)
+    ]
 
+    early_stop = early_stop_threshold is not None
     if judge_type == "agent":
+        judge_config = GenerateConfig(batch=batch)
         judge = judge_agent(
-            agent_prompt=DEBATER_JUDGE_PROMPT, ignore_msg_with_tags=["<article>"]
+            agent_prompt=DEBATER_JUDGE_PROMPT
+            + (" " + JUDGE_QUOTE_PROMPT if verify_quotes is not None else "")
+            + (" " + JUDGE_CONFIDENCE_PROMPT if early_stop else ""),
+            ignore_msg_with_tags=["<article>"],
+            cache=cache,
+            layout=message_layout,
+            config=judge_config.merge(CONFIDENCE_CONFIG)
+            if early_stop
+            else judge_config,
+            verify_quotes=verify_quotes,
+            compaction=compaction(
+                judge_compaction, judge_token_budget, judge_keep_messages
+            ),
         )
+    elif early_stop and judge_type in ("human", "web"):
+        raise ValueError("Early stopping needs an agent judge")
+    elif judge_compaction is not None and judge_type in ("human", "web"):
+        raise ValueError("Judge compaction needs an agent judge")
     elif judge_type == "human":
-        judge = human_judge_agent(ignore_msg_with_tags=["<article>"])
+        judge = human_judge_agent(
+            ignore_msg_with_tags=["<article>"], verify_quotes=verify_quotes
+        )
+    elif judge_type == "web":
+        judge = web_judge_agent(
+            JudgeServer(port=judge_server_port, lease_timeout=judge_lease_timeout),
+            ignore_msg_with_tags=["<article>"],
+            verify_quotes=verify_quotes,
+        )
     else:
         raise ValueError(f"Wrong {judge_type=}")
 
@@ -90,23 +232,259 @@ def debate_runner(
         debaters=debaters,
         judge=judge,
         interactive=interactive,
+        simultaneous=simultaneous,
+        early_stop_threshold=early_stop_threshold,
+        checkpoints=checkpoint_store(
+            checkpoint_dir,
+            {
+                "protocol": "debate",
+                "dataset_path": dataset_path,
+                "num_turns": num_turns,
+                "num_debaters": num_debaters,
+                "interactive": interactive,
+                "simultaneous": simultaneous,
+                "debater_model": debater_model,
+                "judge_model": judge_model,
+                "judge_type": judge_type,
+                "random_seed": random_seed,
+                "message_layout": message_layout,
+                "best_of_n": best_of_n,
+                "early_stop_threshold": early_stop_threshold,
+                "verify_quotes": verify_quotes,
+                "judge_compaction": judge_compaction,
+                "judge_token_budget": judge_token_budget,
+                "judge_keep_messages": judge_keep_messages,
+            },
+        ),
     )
 
-    run_name = f"debate_{num_debaters=}_{num_turns=}_{interactive=}_{judge_type=}"
+    run_name = (
+        f"debate_{num_debaters=}_{num_turns=}_{interactive=}_{simultaneous=}"
+        f"_{judge_type=}_{best_of_n=}_{early_stop_threshold=}_{verify_quotes=}"
+        f"_{judge_compaction=}"
+    )
 
     return Task(
         dataset=dataset,
+        setup=[use_telemetry(telemetry), use_scheduler(scheduler)],
         solver=[
             multiple_choice_no_generation(template=MCQ_TEMPLATE),
-            user_message(ARTICLE_TEMPLATE),
-            debate_solver, # type: ignore
+            article_message(ARTICLE_TEMPLATE),
+            debate_solver,  # type: ignore
         ],
         message_limit=20,
         model_roles={"debater": debater_model, "judge": judge_model},
         # TODO: Add generation for both models
-        config=GenerateConfig(temperature=0.1, max_tokens=300, seed=random_seed),
+        config=GenerateConfig(
+            temperature=0.1, max_tokens=300, seed=random_seed, batch=batch
+        ),
         name=run_name,
-        # TODO: Add custom scorer: judge model will evaluate letter based
-        # on given conversation
-        scorer=answer(pattern="letter"),
+        # a human judge's last answer is the decision
+        scorer=judge_logprobs(
+            judge_compaction=judge_compaction,
+            judge_token_budget=judge_token_budget,
+            judge_keep_messages=judge_keep_messages,
+        )
+        if judge_type == "agent"
+        else answer(pattern="letter"),
+    )
+
+
+@task
+def debate_sweep_runner(
+    dataset_path: str,
+    num_turns: list[int] = [1, 2, 3, 4],
+    interactive: list[bool] = [False],
+    judge_models: list[str] = ["openai/gpt-4.1-nano"],
+    num_debaters: int = 2,
+    simultaneous: bool = False,
+    debater_model: str = "openai/gpt-4.1-nano",
+    random_seed: int = 25,
+    shard: int = 0,
+    num_shards: int = 1,
+    cache_dir: str | None = None,
+    cache_max_size_mb: int = 1024,
+    cache_replay: bool = False,
+    message_layout: MessageLayout = "inline",
+    best_of_n: int = 1,
+    batch_size: int = 0,
+    batch_delay: float = 15.0,
+):
+    """Debates for every combination of num_turns, interactive and judge_models.
+
+    Configs share the debate turns they have in common, see `debate_sweep`. Scores
+    have one value per config.
+    """
+    dataset = QuALITY(
+        Path(dataset_path),
+        random_seed=random_seed,
+    ).get_memory_dataset("dev", shard=dataset_shard(shard, num_shards))
+
+    cache = generation_cache(cache_dir, cache_max_size_mb, cache_replay)
+    batch = batch_config(batch_size, batch_delay)
+    debaters = [
+        debater_agent(
+            agent_prompt=DEBATER_PROMPT,
+            cache=cache,
+            layout=message_layout,
+            n=best_of_n,
+            config=GenerateConfig(batch=batch),
+        )
+        for _ in range(num_debaters)
+    ]
+    judge_roles = {model: f"judge_{i}" for i, model in enumerate(judge_models)}
+    judges = {
+        model: judge_agent(
+            agent_prompt=DEBATER_JUDGE_PROMPT,
+            ignore_msg_with_tags=["<article>"],
+            cache=cache,
+            layout=message_layout,
+            config=GenerateConfig(batch=batch),
+            model_role=role,
+        )
+        for model, role in judge_roles.items()
+    }
+    configs = [
+        SweepConfig(turns, is_interactive, model)
+        for turns in num_turns
+        for is_interactive in interactive
+        for model in judge_models
+    ]
+
+    return Task(
+        dataset=dataset,
+        solver=[
+            multiple_choice_no_generation(template=MCQ_TEMPLATE),
+            article_message(ARTICLE_TEMPLATE),
+            debate_sweep(debaters, judges, configs, simultaneous),  # type: ignore
+        ],
+        model_roles={
+            "debater": debater_model,
+            # preference model of best-of-N
+            "judge": judge_models[0],
+            **{role: model for model, role in judge_roles.items()},
+        },
+        config=GenerateConfig(
+            temperature=0.1, max_tokens=300, seed=random_seed, batch=batch
+        ),
+        name=f"debate_sweep_{num_debaters=}_{simultaneous=}",
+        scorer=sweep_answers(),
+    )
+
+
+@task
+def rejudge_runner(
+    log_path: str,
+    protocol: Literal["consultancy", "debate"] = "debate",
+    judge_model: str = "openai/gpt-4.1-nano",
+    dataset_path: str | None = None,
+    symmetric: bool = False,
+    cache_dir: str | None = None,
+    cache_max_size_mb: int = 1024,
+    message_layout: MessageLayout = "inline",
+    batch_size: int = 0,
+    batch_delay: float = 15.0,
+    verify_quotes: float | None = None,
+    judge_compaction: CompactionMode | None = None,
+    judge_token_budget: int = 4000,
+    judge_keep_messages: int = 2,
+):
+    """Judge finished transcripts of an eval log (or a directory of logs) again.
+
+    Judge messages are dropped and only the judge runs, once per transcript, so
+    judges can be compared without generating consultant or debater turns again.
+    dataset_path is only needed to resolve articles, for a symmetric judge or quote
+    verification.
+    """
+    if dataset_path is not None:
+        QuALITY(Path(dataset_path)).prepare_datasets(["dev"])
+    cache = generation_cache(cache_dir, cache_max_size_mb, replay=False)
+    batch = batch_config(batch_size, batch_delay)
+    judge_prompt = (
+        CONSULTANT_JUDGE_PROMPT if protocol == "consultancy" else DEBATER_JUDGE_PROMPT
+    )
+    judge = judge_agent(
+        agent_prompt=judge_prompt
+        + (" " + JUDGE_QUOTE_PROMPT if verify_quotes is not None else ""),
+        ignore_msg_with_tags=[] if symmetric else ["<article>"],
+        cache=cache,
+        layout=message_layout,
+        config=GenerateConfig(batch=batch),
+        verify_quotes=verify_quotes,
+        compaction=compaction(
+            judge_compaction, judge_token_budget, judge_keep_messages
+        ),
+    )
+    return Task(
+        dataset=transcript_dataset(log_path),
+        solver=[judge],  # type: ignore
+        model_roles={"judge": judge_model},
+        config=GenerateConfig(temperature=0.0, max_tokens=300, batch=batch),
+        name=f"rejudge_{protocol}",
+        scorer=judge_logprobs(
+            ignore_msg_with_tags=[] if symmetric else ["<article>"],
+            judge_compaction=judge_compaction,
+            judge_token_budget=judge_token_budget,
+            judge_keep_messages=judge_keep_messages,
+        ),
+    )
+
+
+def dataset_shard(shard: int, num_shards: int) -> tuple[int, int] | None:
+    """Shard of the dataset to run, None for all of it."""
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"Shard index must be in [0, {num_shards}), got {shard}")
+    return (shard, num_shards) if num_shards > 1 else None
+
+
+def generation_cache(
+    cache_dir: str | None, max_size_mb: int, replay: bool
+) -> GenerationCache | None:
+    if cache_dir is None:
+        return None
+    return GenerationCache(Path(cache_dir), max_size=max_size_mb * 2**20, replay=replay)
+
+
+def checkpoint_store(
+    checkpoint_dir: str | None, config: dict[str, object]
+) -> CheckpointStore | None:
+    if checkpoint_dir is None:
+        return None
+    return CheckpointStore(Path(checkpoint_dir), config)
+
+
+def compaction(
+    mode: CompactionMode | None, token_budget: int, keep_messages: int
+) -> Compaction | None:
+    if mode is None:
+        return None
+    return Compaction(mode, token_budget, keep_messages)
+
+
+def batch_config(size: int, delay: float) -> BatchConfig | None:
+    """Batch config that submits turns of up to size samples as one batch job.
+
+    A batch is sent once size requests are queued or delay seconds have passed, and
+    is polled for results every delay seconds. size <= 0 sends live requests.
+    """
+    if size <= 0:
+        return None
+    return BatchConfig(size=size, send_delay=delay, tick=delay)
+
+
+def task_scheduler(rate_limits: dict[str, dict[str, float]] | None) -> Scheduler:
+    """Rate limits by role or model name, e.g.
+    `{"judge": {"requests_per_minute": 500, "tokens_per_minute": 200000}}`."""
+    return Scheduler(
+        {name: RateLimit(**limit) for name, limit in (rate_limits or {}).items()}
+    )
+
+
+def task_telemetry(
+    enabled: bool, jsonl_path: str | None, prometheus_path: str | None
+) -> Telemetry:
+    return Telemetry(
+        enabled,
+        Path(jsonl_path) if jsonl_path else None,
+        Path(prometheus_path) if prometheus_path else None,
     )
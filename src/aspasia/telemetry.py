@@ -0,0 +1,167 @@
+import json
+import os
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from inspect_ai.model import Model, ModelOutput
+from inspect_ai.solver._task_state import sample_state
+from inspect_ai.util import StoreModel, store_as
+from pydantic import Field
+
+# protocol turn of the running sample, set by `turn_span`
+_current_turn: ContextVar[int | None] = ContextVar("current_turn", default=None)
+# telemetry of the running sample's task, set by the `use_telemetry` solver
+_telemetry: ContextVar["Telemetry"] = ContextVar("telemetry")
+
+# span field -> (Prometheus metric, help), summed per role and model
+PROMETHEUS_METRICS = {
+    "latency": ("aspasia_model_latency_seconds_total", "Model call time."),
+    "queue_wait": ("aspasia_queue_wait_seconds_total", "Wait for connections."),
+    "input_tokens": ("aspasia_input_tokens_total", "Input tokens."),
+    "output_tokens": ("aspasia_output_tokens_total", "Output tokens."),
+    "cached_tokens": ("aspasia_cached_tokens_total", "Cached input tokens."),
+    "filtered_messages": ("aspasia_filtered_messages_total", "Messages filtered."),
+}
+
+
+class TurnSpans(StoreModel):
+    """Spans of agent generations and protocol turns, saved in the sample store."""
+
+    spans: list[dict[str, Any]] = Field(default_factory=list)
+
+
+class Telemetry:
+    """Per-turn spans of agents and protocols.
+
+    Disabled by default, when it's off agents and protocols only check `enabled`.
+    When on, every span is saved in the sample store and optionally appended to a
+    JSONL file and summed into a Prometheus text file (rewritten after every span,
+    e.g. for the node exporter textfile collector).
+
+    Every task has its own telemetry, agents use the one of the running sample's
+    task, see `current_telemetry`.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        jsonl_path: Path | None = None,
+        prometheus_path: Path | None = None,
+    ) -> None:
+        self.enabled = enabled or jsonl_path is not None or prometheus_path is not None
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._totals: dict[tuple[str, str, str], float] = defaultdict(float)
+        self._turns: dict[tuple[str, str], int] = defaultdict(int)
+
+    def record_generation(
+        self,
+        role: str,
+        model: Model,
+        output: ModelOutput,
+        wall_time: float,
+        num_messages: int,
+        num_filtered: int,
+    ) -> None:
+        usage = output.usage
+        latency = output.time or 0.0
+        self.record(
+            {
+                "kind": "generate",
+                "role": role,
+                "model": str(model),
+                "turn": _current_turn.get(),
+                "wall_time": wall_time,
+                "latency": latency,
+                "queue_wait": max(wall_time - latency, 0.0),
+                "input_tokens": usage.input_tokens if usage else 0,
+                "output_tokens": usage.output_tokens if usage else 0,
+                "cached_tokens": (usage.input_tokens_cache_read or 0) if usage else 0,
+                "input_messages": num_messages,
+                "filtered_messages": num_filtered,
+            }
+        )
+
+    def record(self, span: dict[str, Any]) -> None:
+        span["time"] = time.time()
+        turn_spans = store_as(TurnSpans)
+        turn_spans.spans = [*turn_spans.spans, span]
+        if self.jsonl_path is not None:
+            state = sample_state()
+            line = {
+                "sample_id": state.sample_id if state else None,
+                "epoch": state.epoch if state else None,
+                **span,
+            }
+            with self.jsonl_path.open("a") as f:
+                f.write(json.dumps(line) + "\n")
+        if self.prometheus_path is not None and span["kind"] == "generate":
+            labels = (span["role"], span["model"])
+            self._turns[labels] += 1
+            for field in PROMETHEUS_METRICS:
+                self._totals[(field, *labels)] += span[field]
+            self.write_prometheus(self.prometheus_path)
+
+    def write_prometheus(self, path: Path) -> None:
+        lines = [
+            "# HELP aspasia_generations_total Agent generations.",
+            "# TYPE aspasia_generations_total counter",
+        ]
+        for (role, model), count in self._turns.items():
+            lines.append(
+                f'aspasia_generations_total{{role="{role}",model="{model}"}} {count}'
+            )
+        for field, (metric, help) in PROMETHEUS_METRICS.items():
+            lines += [f"# HELP {metric} {help}", f"# TYPE {metric} counter"]
+            for role, model in self._turns:
+                value = self._totals[(field, role, model)]
+                lines.append(f'{metric}{{role="{role}",model="{model}"}} {value}')
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+_disabled = Telemetry()
+
+
+def current_telemetry() -> Telemetry:
+    """Telemetry of the running sample's task, disabled outside tasks that set one."""
+    return _telemetry.get(_disabled)
+
+
+def set_telemetry(telemetry: Telemetry) -> None:
+    _telemetry.set(telemetry)
+
+
+@contextmanager
+def turn_span(protocol: str, turn: int) -> Iterator[None]:
+    """Span of one protocol turn, agent generations inside get its turn index."""
+    telemetry = current_telemetry()
+    if not telemetry.enabled:
+        yield
+        return
+    token = _current_turn.set(turn)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_turn.reset(token)
+        # a turn that finished in a resumed run keeps the span of that run
+        if not any(
+            span["kind"] == "turn"
+            and (span["protocol"], span["turn"]) == (protocol, turn)
+            for span in store_as(TurnSpans).spans
+        ):
+            telemetry.record(
+                {
+                    "kind": "turn",
+                    "protocol": protocol,
+                    "turn": turn,
+                    "wall_time": time.perf_counter() - start,
+                }
+            )
@@ -1,27 +1,143 @@
+from collections import OrderedDict
+from collections.abc import Callable
 from inspect import cleandoc
 
-from inspect_ai.model import ChatMessageSystem
+from inspect_ai.model import ChatMessage, ChatMessageSystem
 from rich.console import Console
 
+from aspasia.datasets.article_store import resolve_articles
+
+MAX_CACHED_DECISIONS = 100_000
+MAX_VIEWS_PER_AGENT = 1024
+
+# (message id, ignore tags) -> whether message is filtered out
+_ignore_decisions: OrderedDict[tuple[str, tuple[str, ...]], bool] = OrderedDict()
+
 
 def strip_prompt(prompt: str) -> str:
     prompt = cleandoc(prompt).rstrip().replace("\n", "")
     return prompt
 
 
-def prepare_messages(messages, ignore_tags: list[str], agent_prompt: str | None = None):
-    """Prepare message history by adding system prompt for agent and filtering messages
-    based on ignore_tags."""
+def is_ignored(message: ChatMessage, ignore_tags: tuple[str, ...]) -> bool:
+    """Whether message starts with one of ignore_tags, decided once per message."""
+    if not ignore_tags:
+        return False
+    if message.id is None:
+        return str(message.content).startswith(ignore_tags)
+    key = (message.id, ignore_tags)
+    ignored = _ignore_decisions.get(key)
+    if ignored is None:
+        ignored = str(message.content).startswith(ignore_tags)
+        _ignore_decisions[key] = ignored
+        if len(_ignore_decisions) > MAX_CACHED_DECISIONS:
+            _ignore_decisions.popitem(last=False)
+    return ignored
+
+
+def prepare_messages(
+    messages,
+    ignore_tags: list[str],
+    agent_prompt: str | None = None,
+    transform: Callable[[ChatMessage], ChatMessage] | None = None,
+):
+    """Prepare message history by adding system prompt for agent, filtering messages
+    based on ignore_tags, resolving article references and applying transform."""
     prepared_messages = (
         [ChatMessageSystem(content=agent_prompt)] if agent_prompt else []
     )
+    tags = tuple(ignore_tags)
     for message in messages:
-        if any(str(message.content).startswith(tag) for tag in ignore_tags):
+        if is_ignored(message, tags):
             continue  # skip messages starting with tags from ignore_tags
         prepared_messages.append(message)
+    prepared_messages = resolve_articles(prepared_messages)
+    if transform is not None:
+        prepared_messages = [transform(message) for message in prepared_messages]
     return prepared_messages
 
 
+class MessageView:
+    """Agent's append-only copy of a sample's message history.
+
+    Same result as `prepare_messages`, but every update only filters, resolves and
+    transforms the messages added since the previous one. If earlier history was
+    rewritten, the view is rebuilt.
+    """
+
+    def __init__(
+        self,
+        ignore_tags: list[str] | tuple[str, ...] = (),
+        agent_prompt: str | None = None,
+        transform: Callable[[ChatMessage], ChatMessage] | None = None,
+    ) -> None:
+        self.ignore_tags = tuple(ignore_tags)
+        self.agent_prompt = agent_prompt
+        self.transform = transform
+        self.reset()
+
+    def reset(self) -> None:
+        self.messages: list[ChatMessage] = (
+            [ChatMessageSystem(content=self.agent_prompt)] if self.agent_prompt else []
+        )
+        self.num_filtered = 0
+        self._num_seen = 0
+        self._last_seen_id: str | None = None
+
+    def update(self, messages: list[ChatMessage]) -> list[ChatMessage]:
+        if self._num_seen > len(messages) or (
+            self._num_seen and messages[self._num_seen - 1].id != self._last_seen_id
+        ):
+            self.reset()
+        new_messages = [
+            message
+            for message in messages[self._num_seen :]
+            if not is_ignored(message, self.ignore_tags)
+        ]
+        self.num_filtered += len(messages) - self._num_seen - len(new_messages)
+        new_messages = resolve_articles(new_messages)
+        if self.transform is not None:
+            new_messages = [self.transform(message) for message in new_messages]
+        self.messages.extend(new_messages)
+        self._num_seen = len(messages)
+        self._last_seen_id = messages[-1].id if messages else None
+        # a copy, the view is shared by forked branches of a sample whose updates
+        # mustn't change the input of a generation still running
+        return list(self.messages)
+
+
+class MessageViews:
+    """Message views of one agent, one per sample.
+
+    Agents are shared by all samples of a task, so views are keyed by the id of the
+    sample's first message and the least recently used ones are dropped.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[list[ChatMessage]], MessageView],
+        max_views: int = MAX_VIEWS_PER_AGENT,
+    ) -> None:
+        self.factory = factory
+        self.max_views = max_views
+        self._views: OrderedDict[str | None, MessageView] = OrderedDict()
+
+    def view(self, messages: list[ChatMessage]) -> MessageView:
+        key = messages[0].id if messages else None
+        view = self._views.get(key)
+        if view is None:
+            view = self.factory(messages)
+            self._views[key] = view
+            if len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        else:
+            self._views.move_to_end(key)
+        return view
+
+    def update(self, messages: list[ChatMessage]) -> list[ChatMessage]:
+        return self.view(messages).update(messages)
+
+
 def display_chat_history_in_console(console: Console, messages: list) -> None:
     for message in messages:
         console.print(f"ROLE: {message.role}\n", message.content)
@@ -0,0 +1,122 @@
+import os
+from pathlib import Path
+
+import pytest
+from inspect_ai.model import (
+    ChatMessage,
+    ChatMessageAssistant,
+    ChatMessageSystem,
+    ChatMessageUser,
+    GenerateConfig,
+    ModelOutput,
+    get_model,
+)
+
+from aspasia.cache import GenerationCache, GenerationCacheMissError
+
+MODEL = get_model("mockllm/model")
+
+
+def history() -> list[ChatMessage]:
+    return [
+        ChatMessageSystem(content="You are a judge."),
+        ChatMessageUser(content="Which answer is correct?"),
+    ]
+
+
+def key(
+    messages: list[ChatMessage] | None = None,
+    role: str = "judge",
+    config: GenerateConfig = GenerateConfig(temperature=0.0),
+    model=MODEL,
+) -> str:
+    return GenerationCache.key(model, role, messages or history(), config)
+
+
+def test_key_ignores_message_ids_and_metadata() -> None:
+    messages = history()
+    tagged = [
+        message.model_copy(update={"id": "other", "metadata": {"agent": "judge"}})
+        for message in messages
+    ]
+
+    assert key(messages) == key(tagged) == key(history())
+
+
+def test_key_ignores_connection_config() -> None:
+    assert key(config=GenerateConfig(temperature=0.0)) == key(
+        config=GenerateConfig(temperature=0.0, max_connections=3, timeout=10)
+    )
+
+
+def test_key_covers_model_role_messages_and_config() -> None:
+    changed = history()
+    changed[1] = ChatMessageUser(content="Which answer is wrong?")
+
+    keys = {
+        key(),
+        key(role="debater"),
+        key(model=get_model("mockllm/other")),
+        key(changed),
+        key(config=GenerateConfig(temperature=1.0)),
+        key(config=GenerateConfig(temperature=0.0, max_tokens=1)),
+    }
+
+    assert len(keys) == 6
+
+
+@pytest.mark.anyio
+async def test_hit_skips_generation(tmp_path: Path) -> None:
+    cache = GenerationCache(tmp_path)
+    calls = 0
+
+    async def generate() -> tuple[list[ChatMessage], ModelOutput]:
+        nonlocal calls
+        calls += 1
+        output = ModelOutput.from_content("mockllm/model", "ANSWER: A")
+        return [output.message], output
+
+    first = await cache.generate_loop(MODEL, "judge", history(), generate=generate)
+    second = await cache.generate_loop(MODEL, "judge", history(), generate=generate)
+
+    assert calls == 1
+    assert second[1].completion == first[1].completion == "ANSWER: A"
+    assert isinstance(second[0][0], ChatMessageAssistant)
+    # hits get fresh message ids
+    assert second[0][0].id != first[0][0].id
+
+
+@pytest.mark.anyio
+async def test_replay_miss_raises(tmp_path: Path) -> None:
+    cache = GenerationCache(tmp_path, replay=True)
+
+    with pytest.raises(GenerationCacheMissError):
+        await cache.generate_loop(MODEL, "judge", history())
+    assert not list(tmp_path.iterdir())
+
+
+def test_eviction_drops_least_recently_used(tmp_path: Path) -> None:
+    cache = GenerationCache(tmp_path, max_size=2500)
+    output = ModelOutput.from_content("mockllm/model", "x" * 200)
+    keys = [key(role=f"role_{i}") for i in range(3)]
+    for i, k in enumerate(keys[:2]):
+        cache.put(k, [output.message], output)
+        os.utime(cache._path(k), (1000 + i, 1000 + i))
+    # a hit makes the oldest entry the most recently used one
+    assert cache.get(keys[0]) is not None
+
+    cache.put(keys[2], [output.message], output)
+
+    assert cache.size() <= 0.9 * 2500
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_entry_without_messages_is_a_miss(tmp_path: Path) -> None:
+    cache = GenerationCache(tmp_path)
+    output = ModelOutput.from_content("mockllm/model", "ANSWER: A")
+
+    cache.put(key(), [], output)
+
+    assert cache.get(key()) is None
@@ -0,0 +1,50 @@
+import pytest
+from inspect_ai.model import ChatMessageAssistant, ChatMessageSystem, get_model
+from inspect_ai.util import store_as
+from inspect_ai.util._store import Store, init_subtask_store
+
+from aspasia.compaction import Compaction, JudgeCompaction
+
+FILLER = "As I said before, the story makes this clear. " * 20
+
+
+def turns(num_turns: int) -> list:
+    return [ChatMessageSystem(content="You are a judge.")] + [
+        ChatMessageAssistant(
+            content=f"{FILLER}<argument>Turn {i}: A</argument>",
+            metadata={"agent": "debater"},
+        )
+        for i in range(num_turns)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def sample_store() -> None:
+    init_subtask_store(Store())
+
+
+@pytest.mark.anyio
+async def test_extract_keeps_latest_turns_and_arguments() -> None:
+    messages = turns(4)
+
+    compacted = await Compaction("extract", 500, 2).compact(
+        messages, get_model("mockllm/model")
+    )
+
+    assert compacted[0] is messages[0]
+    assert compacted[-2:] == messages[-2:]
+    assert [message.text for message in compacted[1:3]] == [
+        f"[Excerpt of an earlier message]\nTurn {i}: A" for i in range(2)
+    ]
+    [turn] = store_as(JudgeCompaction).turns
+    assert turn["compacted"] == 2 and turn["dropped"] == 0
+    assert turn["tokens"] < turn["full_tokens"]
+
+
+@pytest.mark.anyio
+async def test_unrecorded_compaction() -> None:
+    await Compaction("extract", 500, 2).compact(
+        turns(4), get_model("mockllm/model"), record=False
+    )
+
+    assert store_as(JudgeCompaction).turns == []
@@ -0,0 +1,111 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from inspect_ai.model import ChatMessageUser
+
+from aspasia.judge_server import JudgeServer
+
+
+class Judge:
+    def __init__(self, client: TestClient, session_id: str) -> None:
+        self.client = client
+        self.session_id = session_id
+
+    async def next_turn(self, wait: float = 1.0) -> dict | None:
+        response = await self.client.get(
+            "/api/next", params={"session": self.session_id, "wait": str(wait)}
+        )
+        return None if response.status == 204 else await response.json()
+
+    async def reply(self, turn: dict, reply: str) -> int:
+        response = await self.client.post(
+            f"/api/turns/{turn['turn_id']}",
+            json={"session": self.session_id, "reply": reply},
+        )
+        return response.status
+
+
+async def judge(client: TestClient, name: str) -> Judge:
+    response = await client.post("/api/sessions", json={"name": name})
+    return Judge(client, (await response.json())["session_id"])
+
+
+@pytest.fixture
+def server() -> JudgeServer:
+    return JudgeServer(port=0, lease_timeout=600.0, session_timeout=600.0)
+
+
+@pytest.fixture
+async def client(server: JudgeServer) -> AsyncIterator[TestClient]:
+    async with TestClient(TestServer(server.app())) as client:
+        yield client
+    await server.stop()
+
+
+def ask(server: JudgeServer, sample_id: int) -> asyncio.Task[tuple[str, str]]:
+    return asyncio.create_task(
+        server.ask([ChatMessageUser(content=f"Sample {sample_id}?")], sample_id)
+    )
+
+
+@pytest.mark.anyio
+async def test_judges_lease_distinct_turns(
+    server: JudgeServer, client: TestClient
+) -> None:
+    asks = {sample_id: ask(server, sample_id) for sample_id in (1, 2)}
+    alice, bob = await judge(client, "alice"), await judge(client, "bob")
+
+    alice_turn, bob_turn = await alice.next_turn(), await bob.next_turn()
+
+    assert alice_turn is not None and bob_turn is not None
+    assert {alice_turn["sample_id"], bob_turn["sample_id"]} == {1, 2}
+    assert await bob.next_turn(wait=0.1) is None
+    assert await alice.reply(alice_turn, "ANSWER: A") == 200
+    assert await bob.reply(bob_turn, "ANSWER: B") == 200
+    assert await asks[alice_turn["sample_id"]] == ("ANSWER: A", "alice")
+    assert await asks[bob_turn["sample_id"]] == ("ANSWER: B", "bob")
+
+
+@pytest.mark.anyio
+async def test_expired_lease_goes_back_to_the_queue(
+    server: JudgeServer, client: TestClient
+) -> None:
+    server.lease_timeout = 0.1
+    asked = ask(server, 1)
+    alice, bob = await judge(client, "alice"), await judge(client, "bob")
+    turn = await alice.next_turn()
+    assert turn is not None
+
+    await asyncio.sleep(0.2)
+    requeued = await bob.next_turn()
+
+    assert requeued is not None and requeued["turn_id"] == turn["turn_id"]
+    # the stale lease can't be answered any more
+    assert await alice.reply(turn, "ANSWER: A") == 409
+    assert await bob.reply(requeued, "ANSWER: B") == 200
+    assert await asked == ("ANSWER: B", "bob")
+
+
+@pytest.mark.anyio
+async def test_quiet_session_turn_is_requeued(
+    server: JudgeServer, client: TestClient
+) -> None:
+    server.session_timeout = 0.1
+    asked = ask(server, 1)
+    alice = await judge(client, "alice")
+    turn = await alice.next_turn()
+    assert turn is not None
+
+    await asyncio.sleep(0.2)
+    bob = await judge(client, "bob")
+    requeued = await bob.next_turn()
+
+    assert requeued is not None and requeued["turn_id"] == turn["turn_id"]
+    # alice's session expired with her lease
+    assert await alice.reply(turn, "ANSWER: A") == 401
+    assert await bob.reply(requeued, "ANSWER: B") == 200
+    assert await asked == ("ANSWER: B", "bob")
+    status = await (await client.get("/api/status")).json()
+    assert status == {"pending": 0, "leased": 0, "judges": {"bob": 1}}
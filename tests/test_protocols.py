@@ -0,0 +1,126 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from inspect_ai import Task, eval
+from inspect_ai.agent import Agent, AgentState, agent
+from inspect_ai.dataset import Sample
+from inspect_ai.model import (
+    ChatMessageAssistant,
+    ChatMessageUser,
+    GenerateConfig,
+    ModelAPI,
+    ModelOutput,
+    modelapi,
+)
+from inspect_ai.util import store_as
+from inspect_ai.util._store import Store, init_subtask_store
+
+from aspasia.agents import debater_agent, judge_agent
+from aspasia.protocols import EarlyStopping, SweepConfig, debate, debate_sweep
+
+
+@agent
+def scripted(reply: str) -> Agent:
+    async def execute(state: AgentState) -> AgentState:
+        state.output = ModelOutput.from_content("mockllm/model", reply)
+        state.messages.append(ChatMessageAssistant(content=reply))
+        return state
+
+    return execute
+
+
+@pytest.fixture(autouse=True)
+def sample_store() -> None:
+    init_subtask_store(Store())
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(("num_turns", "turns_run"), [(0, 0), (1, 1), (3, 2)])
+async def test_early_stopping_records_turns_run(num_turns: int, turns_run: int) -> None:
+    # the judge is confident enough from its second reply on
+    replies = iter(["ANSWER: A\nCONFIDENCE: 60%"] + ["ANSWER: A\nCONFIDENCE: 95%"] * 3)
+
+    @agent
+    def judge() -> Agent:
+        async def execute(state: AgentState) -> AgentState:
+            return await scripted(next(replies))(state)
+
+        return execute
+
+    protocol = debate(
+        [scripted("<argument>A</argument>"), scripted("<argument>B</argument>")],
+        judge(),
+        num_turns=num_turns,
+        interactive=True,
+        early_stop_threshold=0.9,
+    )
+    state = await protocol(AgentState(messages=[ChatMessageUser(content="Q?")]))
+
+    early_stopping = store_as(EarlyStopping)
+    assert early_stopping.turns_run == turns_run
+    assert early_stopping.turns_saved == num_turns - turns_run
+    assert len(state.messages) == 1 + 3 * turns_run
+
+
+class LatencyMock(ModelAPI):
+    """Replies after a delay, judges are slower than debaters."""
+
+    async def generate(
+        self, input, tools, tool_choice, config: GenerateConfig
+    ) -> ModelOutput:
+        await asyncio.sleep(0.3 if "judge" in self.model_name else 0.05)
+        return ModelOutput.from_content(self.model_name, f"ANSWER: A ({len(input)})")
+
+
+@modelapi(name="latency_mock")
+def latency_mock() -> type[ModelAPI]:
+    return LatencyMock
+
+
+def test_sweep_branches_keep_their_judge_replies(tmp_path: Path) -> None:
+    new_messages: list[int] = []
+
+    @agent
+    def counted(judge: Agent) -> Agent:
+        async def execute(state: AgentState) -> AgentState:
+            num_messages = len(state.messages)
+            state = await judge(state)
+            new_messages.append(len(state.messages) - num_messages)
+            return state
+
+        return execute
+
+    # judges of earlier turns are still generating while later branches run theirs
+    configs = [
+        SweepConfig(num_turns, interactive, "judge")
+        for num_turns in (1, 2, 3, 4)
+        for interactive in (False, True)
+    ]
+    task = Task(
+        dataset=[
+            Sample(
+                input=[
+                    ChatMessageUser(
+                        content="Which answer is correct?", metadata={"target": "A"}
+                    )
+                ]
+            )
+        ],
+        solver=debate_sweep(
+            [debater_agent(agent_prompt="Debate.") for _ in range(2)],
+            {"judge": counted(judge_agent(agent_prompt="Judge."))},
+            configs,
+        ),
+        model_roles={
+            "debater": "latency_mock/debater",
+            "judge": "latency_mock/judge",
+        },
+    )
+
+    [log] = eval(
+        task, model="latency_mock/debater", display="none", log_dir=str(tmp_path)
+    )
+
+    assert log.status == "success", log.error
+    assert new_messages and set(new_messages) == {1}
@@ -0,0 +1,217 @@
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from aspasia.datasets import QuALITY
+from aspasia.datasets.quality import CACHE_DIR_NAME
+
+OPTIONS = ["first option", "second option", "third option", "fourth option"]
+
+
+# question filter and best distractor before vectorization, as the reference
+def scalar_filter(question: dict) -> bool:
+    true_label = question["gold_label"]
+    coherent_answers = all(
+        annot["untimed_answer"] == true_label for annot in question["validation"]
+    )
+    speed_annot_answers = [
+        annot["speed_answer"] == true_label for annot in question["speed_validation"]
+    ]
+    timed_annot_wrong_half_time = (
+        sum(speed_annot_answers) / len(speed_annot_answers)
+    ) < 0.5
+    untimed_answerable_unambig = all(
+        annot["untimed_eval1_answerability"] == 1 for annot in question["validation"]
+    )
+    avg_context_more_eq_1_5 = bool(
+        np.mean([annot["untimed_eval2_context"] for annot in question["validation"]])
+        >= 1.5
+    )
+    writer_label_coherent = question["writer_label"] == true_label
+    return (
+        coherent_answers
+        and timed_annot_wrong_half_time
+        and untimed_answerable_unambig
+        and avg_context_more_eq_1_5
+        and writer_label_coherent
+    )
+
+
+def scalar_best_distractor(question: dict) -> str:
+    candidates = [annot["untimed_best_distractor"] for annot in question["validation"]]
+    best_distractor_idx = max(candidates, key=lambda x: candidates.count(x))
+    return question["options"][best_distractor_idx - 1]
+
+
+def make_question(rng: random.Random, num_untimed: int, num_speed: int) -> dict:
+    gold = rng.randint(1, 4)
+    # two candidate distractors and even vote counts give many ties
+    distractors = rng.sample([label for label in range(1, 5) if label != gold], 2)
+    return {
+        "question": f"Question {rng.random()}?",
+        "options": OPTIONS,
+        "gold_label": gold,
+        "writer_label": gold if rng.random() < 0.9 else rng.randint(1, 4),
+        "validation": [
+            {
+                "untimed_answer": gold if rng.random() < 0.9 else rng.randint(1, 4),
+                "untimed_eval1_answerability": 1 if rng.random() < 0.9 else 2,
+                "untimed_eval2_context": rng.randint(1, 4),
+                "untimed_best_distractor": rng.choice(distractors),
+            }
+            for _ in range(num_untimed)
+        ],
+        "speed_validation": [
+            {"speed_answer": gold if rng.random() < 0.3 else rng.randint(1, 4)}
+            for _ in range(num_speed)
+        ],
+    }
+
+
+def make_article(rng: random.Random, article_id: str, topic: str) -> dict:
+    return {
+        "article_id": article_id,
+        "set_unique_id": f"{article_id}_set",
+        "title": f"Title {article_id}",
+        "year": 1950,
+        "author": "Author",
+        "topic": topic,
+        "article": f"Text of {article_id}.",
+        "questions": [
+            make_question(rng, rng.choice([2, 3, 4]), rng.randint(1, 5))
+            for _ in range(20)
+        ],
+    }
+
+
+@pytest.fixture
+def questions() -> list[dict]:
+    rng = random.Random(0)
+    return [
+        make_question(rng, rng.choice([2, 3, 4]), rng.randint(1, 5))
+        for _ in range(2000)
+    ]
+
+
+def test_annotation_mask_matches_scalar_filter(questions: list[dict]) -> None:
+    keep, best_distractor_idx = QuALITY._annotation_mask(questions)
+
+    assert keep.tolist() == [scalar_filter(question) for question in questions]
+    assert 0 < keep.sum() < len(questions)
+    assert [
+        question["options"][i - 1]
+        for question, i in zip(questions, best_distractor_idx)
+    ] == [scalar_best_distractor(question) for question in questions]
+
+
+def test_best_distractor_ties_go_to_earliest_vote() -> None:
+    question = make_question(random.Random(1), 0, 1)
+    question["gold_label"] = 1
+    question["validation"] = [
+        {
+            "untimed_answer": 1,
+            "untimed_eval1_answerability": 1,
+            "untimed_eval2_context": 2,
+            "untimed_best_distractor": distractor,
+        }
+        for distractor in (3, 2, 2, 3, 4)
+    ]
+
+    _, best_distractor_idx = QuALITY._annotation_mask([question])
+
+    assert best_distractor_idx.tolist() == [3]
+    assert scalar_best_distractor(question) == OPTIONS[2]
+
+
+def test_empty_speed_validation_is_filtered_out(questions: list[dict]) -> None:
+    question = {**questions[0], "speed_validation": []}
+    # the scalar filter divided by the number of timed annotations
+    with pytest.raises(ZeroDivisionError):
+        scalar_filter(question)
+
+    keep, _ = QuALITY._annotation_mask([question, *questions[1:10]])
+
+    assert not keep[0]
+    assert keep[1:].tolist() == [scalar_filter(q) for q in questions[1:10]]
+
+
+def test_annotation_mask_of_no_questions() -> None:
+    keep, best_distractor_idx = QuALITY._annotation_mask([])
+
+    assert keep.shape == best_distractor_idx.shape == (0,)
+
+
+def test_filter_articles_matches_scalar_loop() -> None:
+    rng = random.Random(2)
+    data = [
+        make_article(rng, "story", "Short stories"),
+        make_article(rng, "essay", "Essays"),
+        make_article(rng, "another_story", "Science fiction short stories"),
+    ]
+
+    examples, articles = QuALITY(Path("unused"))._filter_articles(data)
+
+    expected = [
+        (
+            example["article_id"],
+            question_idx,
+            question["options"][question["gold_label"] - 1],
+            scalar_best_distractor(question),
+        )
+        for example in data
+        if "short stories" in example["topic"].lower()
+        for question_idx, question in enumerate(example["questions"])
+        if scalar_filter(question)
+    ]
+    assert [
+        (
+            example.metadata["article_id"],
+            example.metadata["question_idx"],
+            example.answer["gold"],
+            example.answer["best_distractor"],
+        )
+        for example in examples
+    ] == expected
+    assert expected
+    assert articles == {
+        article_id: f"Text of {article_id}."
+        for article_id in {article_id for article_id, *_ in expected}
+    }
+
+
+def write_split(data_dir: Path, split: str, data: list[dict]) -> None:
+    with open(data_dir / f"QuALITY.v1.0.1.htmlstripped.{split}", "w") as f:
+        f.writelines(json.dumps(example) + "\n" for example in data)
+
+
+def unlabeled(article: dict) -> dict:
+    """Article as in the public test split, without labels and annotations."""
+    return {
+        **article,
+        "questions": [
+            {"question": question["question"], "options": question["options"]}
+            for question in article["questions"]
+        ],
+    }
+
+
+def test_unlabeled_split_has_no_samples(tmp_path: Path) -> None:
+    rng = random.Random(3)
+    write_split(tmp_path, "test", [unlabeled(make_article(rng, "s", "Short stories"))])
+
+    assert len(QuALITY(tmp_path).get_memory_dataset("test")) == 0
+
+
+def test_sharded_load_writes_cache(tmp_path: Path) -> None:
+    rng = random.Random(4)
+    data = [make_article(rng, f"story_{i}", "Short stories") for i in range(5)]
+    write_split(tmp_path, "dev", data)
+
+    sharded = QuALITY(tmp_path).get_memory_dataset("dev", shard=(1, 2))
+    full = QuALITY(tmp_path, use_cache=False).get_memory_dataset("dev")
+
+    assert list((tmp_path / CACHE_DIR_NAME).glob("*.dev.*.pkl"))
+    assert [sample.id for sample in sharded] == [sample.id for sample in full][1::2]
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+from inspect_ai.model import ChatMessageAssistant, ChatMessageUser
+
+from aspasia.datasets.article_store import article_store
+from aspasia.quotes import QuoteIndex, SuffixAutomaton, quote_verifier
+
+ARTICLE = (
+    "The ship left at dawn. Captain Reyes watched the harbor fade, "
+    "and nobody on board spoke until the lighthouse was gone."
+)
+
+
+def brute_force_longest_match(sequence: list[int], query: list[int]) -> int:
+    longest = 0
+    for start in range(len(query)):
+        for end in range(start + 1, len(query) + 1):
+            run = query[start:end]
+            if any(
+                sequence[i : i + len(run)] == run
+                for i in range(len(sequence) - len(run) + 1)
+            ):
+                longest = max(longest, len(run))
+    return longest
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_longest_match_matches_brute_force(seed: int) -> None:
+    rng = random.Random(seed)
+    # small alphabets give many repeats, the cases where states get cloned
+    alphabet = rng.randint(2, 4)
+    sequence = [rng.randrange(alphabet) for _ in range(rng.randint(0, 40))]
+    automaton = SuffixAutomaton(sequence)
+
+    for _ in range(20):
+        query = [rng.randrange(alphabet + 1) for _ in range(rng.randint(0, 12))]
+        assert automaton.longest_match(query) == brute_force_longest_match(
+            sequence, query
+        )
+
+
+def test_match_ratio() -> None:
+    index = QuoteIndex(ARTICLE)
+
+    assert index.match_ratio("the ship left at dawn") == 1.0
+    # case, punctuation and whitespace don't matter
+    assert index.match_ratio("Reyes  watched the HARBOR, fade") == 1.0
+    # words of the article out of order only match in runs
+    assert index.match_ratio("the ship left at noon") == 0.8
+    assert index.match_ratio("dawn at left ship") == 0.25
+    assert index.match_ratio("mutiny") == 0.0
+    assert index.match_ratio("...") == 0.0
+
+
+def test_verify_marks_quotes() -> None:
+    index = QuoteIndex(ARTICLE)
+    text = (
+        "<quote>The ship left at dawn.</quote> proves it, not "
+        "<quote>the ship left at noon</quote>"
+    )
+
+    assert index.verify(text) == (
+        "<v_quote>The ship left at dawn.</v_quote> proves it, not "
+        "<u_quote>the ship left at noon</u_quote>"
+    )
+    assert index.verify(text, min_ratio=0.8) == (
+        "<v_quote>The ship left at dawn.</v_quote> proves it, not "
+        "<v_quote>the ship left at noon</v_quote>"
+    )
+
+
+def test_quote_verifier_uses_the_sample_article() -> None:
+    article_store.update({"test_quotes": ARTICLE})
+    messages = [
+        ChatMessageUser(
+            content="[[article:test_quotes]]", metadata={"article_id": "test_quotes"}
+        ),
+        ChatMessageAssistant(content="<quote>nobody on board spoke</quote>"),
+    ]
+
+    verify = quote_verifier(messages)
+
+    assert verify is not None
+    assert verify(messages[1]).text == "<v_quote>nobody on board spoke</v_quote>"
+    # messages without quotes are kept as is
+    assert verify(messages[0]) is messages[0]
+    assert quote_verifier(messages[1:]) is None
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from inspect_ai.model import ChatMessage, ChatMessageUser, GenerateConfig, get_model
+
+from aspasia.scheduler import (
+    MIN_RATE_SCALE,
+    RATE_SCALE_INCREASE,
+    RateLimit,
+    RoleQueue,
+    Scheduler,
+    current_scheduler,
+)
+
+
+def queue() -> RoleQueue:
+    return RoleQueue("judge", RateLimit(requests_per_minute=600))
+
+
+def test_retries_back_off_once_per_congestion() -> None:
+    judge = queue()
+    admitted = time.monotonic()
+
+    # requests sent before the backoff saw the same congestion
+    judge.release(0, 0, 1, admitted)
+    judge.release(0, 0, 2, admitted)
+
+    assert judge.scale == 0.5
+    assert judge.num_backoffs == 1
+    assert judge.cooldown_until > time.monotonic()
+
+    judge.release(0, 0, 1, time.monotonic())
+
+    assert judge.scale == 0.25
+    assert judge.num_backoffs == 2
+
+
+def test_successes_raise_the_scale_back() -> None:
+    judge = queue()
+    judge.release(0, 0, 1, time.monotonic())
+
+    judge.release(0, 0, 0, time.monotonic())
+
+    assert judge.scale == 0.5 + RATE_SCALE_INCREASE
+    assert judge.num_backoffs == 0
+    for _ in range(20):
+        judge.release(0, 0, 0, time.monotonic())
+    assert judge.scale == 1.0
+
+
+def test_scale_has_a_floor() -> None:
+    judge = queue()
+    for _ in range(10):
+        judge.release(0, 0, 1, time.monotonic())
+
+    assert judge.scale == MIN_RATE_SCALE
+
+
+@pytest.mark.anyio
+async def test_failed_request_backs_off_and_refunds_tokens() -> None:
+    scheduler = Scheduler({"judge": RateLimit(tokens_per_minute=600_000)})
+    model = get_model("mockllm/model")
+    messages: list[ChatMessage] = [ChatMessageUser(content="x" * 400)]
+
+    async def generate():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        await scheduler.generate(
+            "judge", model, messages, GenerateConfig(max_tokens=100), generate
+        )
+
+    judge = scheduler.queue("judge", model)
+    assert judge is not None
+    assert judge.scale == 0.5
+    assert judge.num_backoffs == 1
+    assert judge.tokens is not None
+    assert judge.tokens.tokens == pytest.approx(judge.tokens.capacity)
+
+
+def test_scheduler_without_limits_is_disabled() -> None:
+    assert not current_scheduler().enabled
+    assert Scheduler({"judge": RateLimit(requests_per_minute=1)}).enabled
+    assert Scheduler().queue("judge", get_model("mockllm/model")) is None
@@ -0,0 +1,60 @@
+import math
+
+from inspect_ai.model import ModelOutput
+from inspect_ai.scorer import CORRECT, INCORRECT, SampleScore, Score
+
+from aspasia.scorers import (
+    brier_score,
+    expected_calibration_error,
+    final_answer_probabilities,
+    no_answer_rate,
+)
+
+
+def judged(answer: str | None, probability_a: float, source: str) -> SampleScore:
+    return SampleScore(
+        score=Score(
+            value=CORRECT if answer == "A" else INCORRECT,
+            answer=answer,
+            metadata={
+                "probabilities": {"A": probability_a, "B": 1 - probability_a},
+                "source": source,
+                "target": "A",
+            },
+        )
+    )
+
+
+def test_reply_without_letter_is_uniform() -> None:
+    output = ModelOutput.from_content("mockllm/model", "The")
+
+    assert final_answer_probabilities(output, ["A", "B"]) == (
+        {"A": 0.5, "B": 0.5},
+        "uniform",
+    )
+    assert final_answer_probabilities(
+        ModelOutput.from_content("mockllm/model", "(b"), ["A", "B"]
+    ) == ({"A": 0.0, "B": 1.0}, "completion")
+
+
+def test_replies_without_answer_are_reported_separately() -> None:
+    scores = [
+        judged("A", 0.9, "logprobs"),
+        judged("B", 0.2, "logprobs"),
+        judged(None, 0.5, "uniform"),
+        judged(None, 0.5, "uniform"),
+    ]
+
+    assert math.isclose(brier_score()(scores), (0.1**2 + 0.8**2) / 2)
+    # bins 0.9 (correct) and 0.8 (wrong)
+    assert math.isclose(expected_calibration_error()(scores), (0.1 + 0.8) / 2)
+    assert no_answer_rate()(scores) == 0.5
+
+
+def test_metrics_without_answers() -> None:
+    scores = [judged(None, 0.5, "uniform")]
+
+    assert math.isnan(brier_score()(scores))
+    assert math.isnan(expected_calibration_error()(scores))
+    assert no_answer_rate()(scores) == 1.0
+    assert math.isnan(no_answer_rate()([SampleScore(score=Score(value=CORRECT))]))
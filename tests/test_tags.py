@@ -0,0 +1,65 @@
+from inspect_ai.model import ChatMessageAssistant, ChatMessageUser
+
+from aspasia.tags import parse_tags, public_message
+
+
+def test_public_part_is_arguments_and_quotes() -> None:
+    parsed = parse_tags(
+        "<thinking>B is weaker</thinking> Let me argue.\n"
+        "<argument> A, the crew left early. </argument>\n"
+        "See <quote>the ship left at dawn</quote>\nANSWER: A"
+    )
+
+    assert parsed.public == (
+        "<argument> A, the crew left early. </argument>\n"
+        "<quote>the ship left at dawn</quote>"
+    )
+    assert parsed.private == "B is weaker"
+
+
+def test_quotes_inside_arguments_are_kept_once() -> None:
+    text = "<argument>As <v_quote>the ship left</v_quote> shows, A.</argument>"
+
+    assert parse_tags(text).public == text
+
+
+def test_text_without_public_tags_drops_private_parts() -> None:
+    parsed = parse_tags("<thinking>one</thinking>Which side has evidence?<thinking>two")
+
+    assert parsed.public == "Which side has evidence?"
+    # an unclosed private tag hides the rest of the text
+    assert parsed.private == "one\ntwo"
+    assert parse_tags("ANSWER: A\nCONFIDENCE: 80%").public == (
+        "ANSWER: A\nCONFIDENCE: 80%"
+    )
+
+
+def test_truncated_argument_runs_to_the_end() -> None:
+    parsed = parse_tags("<thinking>plan</thinking><argument>A, because the cre")
+
+    assert parsed.public == "<argument>A, because the cre"
+
+
+def test_tags_inside_private_parts_are_hidden() -> None:
+    parsed = parse_tags(
+        "<thinking>draft <argument>B</argument></thinking><argument>A</argument>"
+    )
+
+    assert parsed.public == "<argument>A</argument>"
+    assert parsed.private == "draft <argument>B</argument>"
+
+
+def test_public_message() -> None:
+    message = ChatMessageAssistant(
+        content="<thinking>hm</thinking><argument>A</argument> ANSWER: A"
+    )
+    public = public_message(message)
+
+    assert public.text == "<argument>A</argument>"
+    assert public.id == message.id
+    assert message.text.startswith("<thinking>")
+    # messages without private or extra parts and user messages are kept as is
+    argument = ChatMessageAssistant(content="<argument>A</argument>")
+    assert public_message(argument) is argument
+    user = ChatMessageUser(content="<thinking>x</thinking>")
+    assert public_message(user) is user
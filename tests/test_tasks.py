@@ -0,0 +1,14 @@
+import pytest
+
+from aspasia.tasks import dataset_shard
+
+
+def test_dataset_shard() -> None:
+    assert dataset_shard(0, 1) is None
+    assert dataset_shard(2, 3) == (2, 3)
+
+
+@pytest.mark.parametrize(("shard", "num_shards"), [(3, 1), (1, 1), (-1, 2), (0, 0)])
+def test_dataset_shard_out_of_range(shard: int, num_shards: int) -> None:
+    with pytest.raises(ValueError, match="Shard index"):
+        dataset_shard(shard, num_shards)